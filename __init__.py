@@ -17,6 +17,10 @@ class NTX_SE_Extension(ComfyExtension):
     async def get_node_list(self) -> list[type[io.ComfyNode]]:
         list_of_nodes = []
 
+        # fill the model lists of ComfyUI from the persistent index (only the changed folders are listed again)
+        from .py.model_index_db import preload_filename_lists
+        preload_filename_lists()
+
         # scan the py subdir, and for each .py file try to call the get_nodes_list function
         import importlib
         import pkgutil
@@ -31,6 +35,18 @@ class NTX_SE_Extension(ComfyExtension):
                     nodes_text += " " + node.__name__
                 logger.info(f"Loaded {len(module_nodes)} nodes from module {module_name} : {nodes_text}")
 
+        # load the files listed in the warmup section of config.yaml, in background
+        from .py.warmup import start_warmup
+        start_warmup()
+
+        # prefetch the loras of the next prompts of the queue, in background
+        from .py.lora_queue_prefetch import start_queue_prefetch
+        start_queue_prefetch()
+
+        # keep the model indexes up to date with the changes of the model folders, in background
+        from .py.model_watcher import start_model_watcher
+        start_model_watcher()
+
         return list_of_nodes
 
 # can be declared async or not, both will work
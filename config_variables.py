@@ -49,9 +49,46 @@ if configuration_file.is_file():
 else:
     logger.warning(f"[WARN] [{ADDON_NAME}] Configuration file not found {configuration_file}")
 
+def parse_byte_size(value, default:int) -> int:
+    # accept a plain number of bytes or a string with a unit suffix (e.g. "512MB", "8 GB", "1.5G")
+    if value is None or value == "":
+        return default
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip().upper().removesuffix("B").removesuffix("I")
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1].strip()) * units[text[-1]])
+        return int(float(text))
+    except ValueError:
+        print(f"[WARN] [{ADDON_NAME}] Invalid byte size in configuration : {value}")
+        return default
+
 INCLUDE_MODELS_FROM_CATALOGUE = CONFIGURATION.get("include_models_from_catalogue", False)
-MAX_CACHED_LORAS = CONFIGURATION.get("cache", {}).get("max_loras", 5)
+MAX_CACHED_LORAS = CONFIGURATION.get("cache", {}).get("max_loras", None) # optional cap on the number of entries
+MAX_CACHED_LORA_BYTES = parse_byte_size(CONFIGURATION.get("cache", {}).get("max_lora_bytes", None), 4 * 1024**3)
+MAX_MAPPED_LORA_BYTES = parse_byte_size(CONFIGURATION.get("cache", {}).get("max_mapped_bytes", None), 8 * 1024**3) # memory-mapped entries (mmap, shared store, disk cache)
+MAX_PATCHED_MODELS = CONFIGURATION.get("cache", {}).get("max_patched_models", 16) # 0 disables the cache of patched models
+LORA_LOADER = CONFIGURATION.get("cache", {}).get("lora_loader", "default") # "default" or "mmap"
+LORA_CACHE_DTYPE = CONFIGURATION.get("cache", {}).get("lora_dtype", "default") # "default" (as stored in the file), "fp16" or "bf16"
+SHARED_LORA_DIR = CONFIGURATION.get("cache", {}).get("shared_dir", "") or "" # e.g. /dev/shm/ntx-lora-cache, empty = disabled
+SHARED_LORA_MAX_BYTES = parse_byte_size(CONFIGURATION.get("cache", {}).get("shared_max_bytes", None), 16 * 1024**3)
+FUSED_LORAS_DIR = CONFIGURATION.get("cache", {}).get("fused_dir", "") or "" # on-disk copies of the fused stacks, empty = memory only
+DISK_LORA_DIR = CONFIGURATION.get("cache", {}).get("disk_dir", "") or "" # local copies of the used loras, converted and mmap-ready, empty = disabled
+DISK_LORA_MAX_BYTES = parse_byte_size(CONFIGURATION.get("cache", {}).get("disk_max_bytes", None), 64 * 1024**3)
+PREFETCH_LORAS = CONFIGURATION.get("cache", {}).get("prefetch_loras", True)
+PREFETCH_WORKERS = CONFIGURATION.get("cache", {}).get("prefetch_workers", 2)
+QUEUE_PREFETCH_DEPTH = CONFIGURATION.get("cache", {}).get("queue_prefetch_depth", 2) # pending prompts whose loras are prefetched, 0 = disabled
 DOWNLOAD_MISSING_LORAS = CONFIGURATION.get("download_missing_loras", False) and sys.platform.lower().startswith("linux") # only download for linux (pods)
+CHECK_LORA_COMPATIBILITY = CONFIGURATION.get("check_lora_compatibility", True)
+LORA_DUPLICATES = CONFIGURATION.get("lora_duplicates", "first") # strengths of the entries of a stack using the same file: first, sum or max
+if not LORA_DUPLICATES in ["first", "sum", "max"]:
+    LORA_DUPLICATES = "first"
 CLOUD_STORAGE_ID = CONFIGURATION.get("cloud_storage_id", "")
+CLOUD_DOWNLOAD_WORKERS = CONFIGURATION.get("cloud_download_workers", 4) # rclone processes running at the same time
+WARMUP = CONFIGURATION.get("warmup", {}) or {}
+WATCHER = CONFIGURATION.get("watcher", {}) or {}
+MODEL_INDEX_CONFIG = CONFIGURATION.get("model_index", {}) or {}
 API_TOKENS = CONFIGURATION.get("tokens", {})
 TEMPLATES_SUBDIR = CONFIGURATION.get("templates_subdir", "")
@@ -0,0 +1,567 @@
+import comfy.utils
+import torch
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from ..config_variables import MAX_CACHED_LORAS, MAX_CACHED_LORA_BYTES, MAX_MAPPED_LORA_BYTES, MAX_PATCHED_MODELS, LORA_LOADER, LORA_CACHE_DTYPE, PREFETCH_LORAS, PREFETCH_WORKERS, SHARED_LORA_DIR, SHARED_LORA_MAX_BYTES, DISK_LORA_DIR, DISK_LORA_MAX_BYTES
+from .logging import logger
+from .lora_index import LORA_INDEX, convert_lora
+from .lora_store import SharedLoraStore, LoraDiskCache
+from .utils import find_model_file
+from ..scripts.safetensors_file import load_safetensors_mmap, is_safetensors_file
+
+# ===== LoRA cache =========================================================================================================================
+
+def format_bytes(size:int) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def state_dict_bytes(state_dict) -> int:
+    # memory held by the tensors of a state dict (non-tensor values are ignored)
+    total = 0
+    for value in state_dict.values():
+        try:
+            total += value.numel() * value.element_size()
+        except AttributeError:
+            pass
+    return total
+
+# names accepted by the lora_dtype option
+STORE_DTYPES = {
+    "fp16": torch.float16,
+    "bf16": torch.bfloat16,
+}
+
+def downcast_state_dict(state_dict, dtype) -> dict:
+    # convert the floating point tensors wider than dtype (fp32, fp64), leave everything else untouched
+    itemsize = torch.empty((), dtype=dtype).element_size()
+    result = {}
+    for (key, value) in state_dict.items():
+        if isinstance(value, torch.Tensor) and value.is_floating_point() and value.element_size() > itemsize:
+            value = value.to(dtype)
+        result[key] = value
+    return result
+
+# conversion of the copies written by the shared store and the disk cache (see normalize_lora)
+LORA_STORE_TAG = f"{LORA_CACHE_DTYPE}|{'converted' if convert_lora is not None else 'raw'}"
+
+# host-wide store shared with the other ComfyUI processes (disabled when cache.shared_dir is empty)
+SHARED_STORE = SharedLoraStore(SHARED_LORA_DIR, SHARED_LORA_MAX_BYTES, tag=LORA_STORE_TAG)
+
+# local converted copies of the lora files (disabled when cache.disk_dir is empty)
+DISK_CACHE = LoraDiskCache(DISK_LORA_DIR, DISK_LORA_MAX_BYTES, tag=LORA_STORE_TAG)
+
+def normalize_lora(lora:dict) -> dict:
+    # key names converted to the standard format, floating point tensors in the cache dtype
+    if convert_lora is not None:
+        lora = convert_lora(lora)
+    dtype = STORE_DTYPES.get(LORA_CACHE_DTYPE, None)
+    if dtype is not None:
+        lora = downcast_state_dict(lora, dtype)
+    return lora
+
+def read_lora_source(path:str) -> (dict, bool):
+    # state dict of a lora file, through the disk cache when enabled;
+    # also return True when the tensors are mapped from the disk cache copy
+    if DISK_CACHE.enabled:
+        lora = DISK_CACHE.load(path)
+        if lora is not None:
+            return (lora, True)
+    lora = comfy.utils.load_torch_file(path, safe_load=True)
+    if DISK_CACHE.enabled:
+        copy = DISK_CACHE.save(path, normalize_lora(lora))
+        if copy is not None:
+            return (copy, True)
+    return (lora, False)
+
+def load_lora_file(path:str) -> (dict, str, str):
+    """Load the state dict of a LoRA file.
+    Return the state dict, where it comes from ("shared", "disk_cache", "mmap" or "disk")
+    and the key of the shared store copy (None when not in the shared store).
+    "shared", "disk_cache" and "mmap" tensors are memory-mapped: they live in the OS
+    page cache instead of the process memory.
+    """
+    if SHARED_STORE.enabled:
+        try:
+            (key, lora) = SHARED_STORE.acquire(path)
+            if lora is not None:
+                return (lora, "shared", key)
+            (lora, _) = read_lora_source(path)
+            # normalised whether or not it came through the disk cache, as the tag says
+            lora = normalize_lora(lora)
+            shared_lora = SHARED_STORE.publish(path, key, lora)
+            if shared_lora is not None:
+                return (shared_lora, "shared", key)
+            return (lora, "disk", None)
+        except Exception as e:
+            logger.warning(f"SharedLoraStore : {path} not shared - {e}")
+
+    if DISK_CACHE.enabled:
+        (lora, mapped) = read_lora_source(path)
+        return (lora, "disk_cache" if mapped else "disk", None)
+    if LORA_LOADER == "mmap" and is_safetensors_file(path):
+        return (load_safetensors_mmap(path), "mmap", None)
+    return (comfy.utils.load_torch_file(path, safe_load=True), "disk", None)
+
+class LoraCacheEntry():
+    def __init__(self, path:str, lora, size:int, mapped:bool=False, shared_key:str=None):
+        self.path = path
+        self.lora = lora
+        self.size = size
+        self.mapped = mapped
+        self.shared_key = shared_key # copy in the host-wide shared store, released on eviction
+        self.saved = 0           # bytes saved by the downcast to the cache store_dtype
+        self.hits = 0
+        self.last_used = time.time()
+
+    @property
+    def charged_bytes(self) -> int:
+        # memory-mapped entries do not count against the cache budget
+        return 0 if self.mapped else self.size
+
+class LoraLoad():
+    # a load in progress, waited for by the concurrent requests of the same file
+    def __init__(self):
+        self.done = threading.Event()
+        self.lora = None
+        self.error = None
+
+class LoraCache():
+    """LRU cache of LoRA state dicts keyed by absolute file path.
+
+    Entries are evicted least-recently-used first once the total size goes over
+    max_bytes (or the number of entries over max_entries, when set). Entries
+    loaded with memory-mapping have their own budget, max_mapped_bytes: they do
+    not use process memory, but hold the file pages and the shared copies. With a
+    store_dtype ("fp16" / "bf16"), fp32 and fp64 tensors are downcast when
+    they are added (memory-mapped entries are kept as they are). Paths
+    protected by a running ApplyLoraStack are never evicted, even if this
+    leaves the cache temporarily over budget. Concurrent loads of the same
+    file (e.g. a prefetch thread and ApplyLoraStack) share a single read: the
+    other requests wait for it and receive the same state dict.
+    """
+    def __init__(self, max_bytes:int, max_entries:int=None, store_dtype:str="default", max_mapped_bytes:int=None):
+        self.max_bytes = max_bytes
+        self.max_mapped_bytes = max_mapped_bytes
+        self.max_entries = max_entries
+        self.store_dtype = STORE_DTYPES.get(store_dtype, None)
+        self.saved_bytes = 0         # memory saved by the downcast of the current entries
+        self.entries = OrderedDict() # path -> LoraCacheEntry, least recently used first
+        self.total_bytes = 0         # process memory held by the entries
+        self.mapped_bytes = 0        # file data mapped by the entries
+        self.protected = {}          # path -> number of active protect() blocks
+        self.loading = {}            # path -> LoraLoad, files being loaded
+        self.lock = threading.RLock()
+
+    def __contains__(self, path:str):
+        with self.lock:
+            return path in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def get(self, path:str):
+        # return the cached state dict (marking it as most recently used), or None
+        with self.lock:
+            entry = self.entries.get(path, None)
+            if entry is None:
+                return None
+            self.entries.move_to_end(path)
+            entry.hits += 1
+            entry.last_used = time.time()
+            return entry.lora
+
+    def load(self, path:str):
+        # return the state dict of a file from the cache, loading it (and caching it) on a miss,
+        # and a description of where it came from
+        with self.lock:
+            lora = self.get(path)
+            if lora is not None:
+                return (lora, "retrieved from cache")
+            pending = self.loading.get(path, None)
+            if pending is None:
+                pending = self.loading[path] = LoraLoad()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            # single flight: wait for the load started by another thread
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return (pending.lora, "loaded by a concurrent request")
+
+        try:
+            (lora, msg) = self._load(path)
+            pending.lora = lora
+            return (lora, msg)
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self.lock:
+                self.loading.pop(path, None)
+            pending.done.set()
+
+    def _load(self, path:str):
+        # evict before loading (the size is known from the file header) to limit the peak memory
+        self.make_room(LORA_INDEX.get_bytes(path))
+        (lora, source, shared_key) = load_lora_file(path)
+        # use the cached copy: it may have been converted to the cache dtype
+        lora = self.put(path, lora, mapped=(source != "disk"), shared_key=shared_key).lora
+        messages = {
+            "shared": "mapped from the shared store (added to cache)",
+            "disk_cache": "mapped from the disk cache (added to cache)",
+            "mmap": "memory-mapped (added to cache)",
+            "disk": "loaded from disk (added to cache)",
+        }
+        return (lora, messages[source])
+
+    def put(self, path:str, lora, mapped:bool=False, shared_key:str=None):
+        with self.lock:
+            self._remove(path)
+            saved = 0
+            if self.store_dtype is not None and not mapped:
+                original_size = state_dict_bytes(lora)
+                lora = downcast_state_dict(lora, self.store_dtype)
+                saved = original_size - state_dict_bytes(lora)
+            entry = LoraCacheEntry(path, lora, state_dict_bytes(lora), mapped, shared_key)
+            entry.saved = saved
+            self.entries[path] = entry
+            self.total_bytes += entry.charged_bytes
+            self.mapped_bytes += entry.size - entry.charged_bytes
+            self.saved_bytes += saved
+            if saved > 0:
+                logger.info(f"LoraCache : {path} stored as {self.store_dtype} (saved {format_bytes(saved)})")
+            self.prune()
+            return entry
+
+    def evict(self, path:str) -> bool:
+        with self.lock:
+            if path in self.protected:
+                return False
+            return self._remove(path) is not None
+
+    def clear(self):
+        # evict every entry not used by a running ApplyLoraStack, return the number of evicted entries
+        with self.lock:
+            evicted = 0
+            for path in list(self.entries.keys()):
+                if not path in self.protected:
+                    self._remove(path)
+                    evicted += 1
+            return evicted
+
+    def describe(self) -> dict:
+        # snapshot of the cache content, least recently used first
+        with self.lock:
+            return {
+                "max_bytes": self.max_bytes,
+                "max_mapped_bytes": self.max_mapped_bytes,
+                "max_entries": self.max_entries,
+                "total_bytes": self.total_bytes,
+                "mapped_bytes": self.mapped_bytes,
+                "saved_bytes": self.saved_bytes,
+                "loading": list(self.loading.keys()),
+                "entries": [{
+                    "path": entry.path,
+                    "bytes": entry.size,
+                    "mapped": entry.mapped,
+                    "shared": entry.shared_key is not None,
+                    "saved_bytes": entry.saved,
+                    "hits": entry.hits,
+                    "last_used": entry.last_used,
+                    "protected": entry.path in self.protected,
+                } for entry in self.entries.values()],
+            }
+
+    def _remove(self, path:str):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            # the patched models built with it hold its tensors too
+            PATCHED_MODELS_CACHE.forget(path)
+            self.total_bytes -= entry.charged_bytes
+            self.mapped_bytes -= entry.size - entry.charged_bytes
+            self.saved_bytes -= entry.saved
+            if entry.shared_key is not None:
+                try:
+                    SHARED_STORE.release(entry.shared_key)
+                except Exception as e:
+                    logger.warning(f"SharedLoraStore : cannot release {entry.path} - {e}")
+        return entry
+
+    def _over_budget(self, extra_bytes:int=0) -> bool:
+        if self.total_bytes + extra_bytes > self.max_bytes or self._over_mapped_budget():
+            return True
+        return self.max_entries is not None and len(self.entries) > self.max_entries
+
+    def _over_mapped_budget(self) -> bool:
+        return self.max_mapped_bytes is not None and self.mapped_bytes > self.max_mapped_bytes
+
+    def _eviction_helps(self, entry, extra_bytes:int) -> bool:
+        # only evict the entries that count against the limit which is exceeded
+        if self.max_entries is not None and len(self.entries) > self.max_entries:
+            return True
+        if entry.mapped:
+            return self._over_mapped_budget()
+        return self.total_bytes + extra_bytes > self.max_bytes
+
+    def make_room(self, size:int):
+        # evict entries so that a new entry of the given size fits the budget (mapped entries are not charged)
+        return self.prune(extra_bytes=size) if LORA_LOADER != "mmap" and not SHARED_STORE.enabled and not DISK_CACHE.enabled else []
+
+    def prune(self, extra_bytes:int=0):
+        # evict least recently used entries until the cache fits its budget
+        with self.lock:
+            if not self._over_budget(extra_bytes):
+                return []
+            evicted = []
+            for path in list(self.entries.keys()):
+                if not self._over_budget(extra_bytes):
+                    break
+                if path in self.protected or not self._eviction_helps(self.entries[path], extra_bytes):
+                    continue
+                entry = self._remove(path)
+                evicted.append(entry)
+                logger.info(f"LoraCache : evicted {path} ({format_bytes(entry.size)})")
+            return evicted
+
+    @contextmanager
+    def protect(self, paths=()):
+        # keep paths in the cache for the duration of the block; more paths can be
+        # protected from inside the block through the yielded function
+        protected_paths = []
+
+        def add(path:str):
+            if path is None:
+                return
+            with self.lock:
+                self.protected[path] = self.protected.get(path, 0) + 1
+                protected_paths.append(path)
+
+        for path in paths:
+            add(path)
+        try:
+            yield add
+        finally:
+            with self.lock:
+                for path in protected_paths:
+                    count = self.protected.get(path, 0) - 1
+                    if count > 0:
+                        self.protected[path] = count
+                    else:
+                        self.protected.pop(path, None)
+                self.prune()
+
+    def log_content(self):
+        with self.lock:
+            logger.info(f"Current cache : {len(self.entries)} entries, {format_bytes(self.total_bytes)} / {format_bytes(self.max_bytes)}"
+                        + (f" (+ {format_bytes(self.mapped_bytes)} memory-mapped)" if self.mapped_bytes > 0 else "")
+                        + (f", {format_bytes(self.saved_bytes)} saved by {self.store_dtype}" if self.saved_bytes > 0 else ""))
+            for entry in self.entries.values():
+                logger.info(f"- {entry.path} ({format_bytes(entry.size)}{', mapped' if entry.mapped else ''}, {entry.hits} hits)")
+
+# shared by all ApplyLoraStack nodes
+LORA_CACHE = LoraCache(max_bytes=MAX_CACHED_LORA_BYTES, max_entries=MAX_CACHED_LORAS, store_dtype=LORA_CACHE_DTYPE, max_mapped_bytes=MAX_MAPPED_LORA_BYTES)
+logger.info(f"LORA_CACHE : max {format_bytes(MAX_CACHED_LORA_BYTES)} (+ {format_bytes(MAX_MAPPED_LORA_BYTES)} memory-mapped)" + ("" if MAX_CACHED_LORAS is None else f", max {MAX_CACHED_LORAS} entries") + f", loader={LORA_LOADER}, dtype={LORA_CACHE_DTYPE}"
+            + ("" if not SHARED_STORE.enabled else f", shared store {SHARED_LORA_DIR} (max {format_bytes(SHARED_LORA_MAX_BYTES)})")
+            + ("" if not DISK_CACHE.enabled else f", disk cache {DISK_LORA_DIR} (max {format_bytes(DISK_LORA_MAX_BYTES)})"))
+
+# ===== Background prefetch ================================================================================================================
+
+PREFETCH_EXECUTOR = None
+PREFETCH_PENDING = set() # lora names queued or being loaded
+PREFETCH_LOCK = threading.Lock()
+
+def _prefetch_lora(lora_name:str):
+    try:
+        (lora_name_found, lora_path) = find_model_file("loras", lora_name)
+        if lora_path is None:
+            logger.info(f"LoraCache : prefetch [{lora_name}] - file not found")
+        elif not lora_path in LORA_CACHE:
+            (_, msg) = LORA_CACHE.load(lora_path)
+            logger.info(f"LoraCache : prefetch [{lora_name_found}] - {msg}")
+    except Exception as e:
+        logger.warning(f"LoraCache : prefetch [{lora_name}] failed - {e}")
+    finally:
+        with PREFETCH_LOCK:
+            PREFETCH_PENDING.discard(lora_name)
+
+def prefetch_loras(lora_stack, force:bool=False):
+    """Warm the LoRA cache in background threads for the entries of a lora stack.
+
+    Called as soon as the stack is known (e.g. parsed from a prompt), so that the
+    file I/O overlaps with the rest of the workflow instead of delaying ApplyLoraStack.
+    Never blocks and never raises. force=True ignores the prefetch_loras option
+    (explicit warm-up requests).
+    """
+    global PREFETCH_EXECUTOR
+    if not (PREFETCH_LORAS or force) or lora_stack is None:
+        return
+
+    with PREFETCH_LOCK:
+        for (lora_name, strength_model, strength_clip) in lora_stack:
+            if strength_model == 0 and strength_clip == 0:
+                continue
+            if lora_name in PREFETCH_PENDING:
+                continue
+            if PREFETCH_EXECUTOR is None:
+                PREFETCH_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, PREFETCH_WORKERS), thread_name_prefix="ntx-lora-prefetch")
+            PREFETCH_PENDING.add(lora_name)
+            PREFETCH_EXECUTOR.submit(_prefetch_lora, lora_name)
+
+# ===== Patched models cache ===============================================================================================================
+
+class PatchedModelNode():
+    def __init__(self, parent, key, model, clip):
+        self.parent = parent
+        self.key = key           # (lora_path, strength_model, strength_clip) applied on top of the parent
+        self.model = model
+        self.clip = clip
+        self.children = {}       # key -> PatchedModelNode
+        self.last_used = 0
+
+class PatchedModelCache():
+    """Prefix tree of the (model, clip) pairs produced by ApplyLoraStack.
+
+    Each root holds a base (model, clip) pair, and each node below it the result
+    of applying one more LoRA to its parent. A new stack starts from the node
+    matching the longest prefix of its entries, so only the LoRAs after that
+    prefix have to be patched. The roots keep a reference to their base model,
+    so the id() used to find them cannot be reused by another object.
+    At most max_nodes patched pairs are kept, least recently used leaves first out,
+    and a single base pair: the patched models share the weights of their base, so the
+    tree is dropped as soon as another base model arrives (e.g. a checkpoint switch),
+    instead of keeping the previous checkpoint in memory. The patches of a node hold the
+    tensors of its LoRA: the nodes using a file are dropped when LoraCache evicts it.
+    """
+    def __init__(self, max_nodes:int, max_roots:int=1):
+        self.max_nodes = max_nodes
+        self.max_roots = max_roots
+        self.roots = {}          # (id(model), id(clip)) -> PatchedModelNode
+        self.nodes_count = 0
+        self.clock = 0
+        self.lock = threading.RLock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_nodes > 0
+
+    def _touch(self, node):
+        self.clock += 1
+        while node is not None:
+            node.last_used = self.clock
+            node = node.parent
+
+    def root(self, model, clip):
+        with self.lock:
+            root_key = (id(model), id(clip))
+            node = self.roots.get(root_key, None)
+            if node is None:
+                while len(self.roots) >= self.max_roots:
+                    self._remove_root(min(self.roots.values(), key=lambda n: n.last_used))
+                node = PatchedModelNode(None, root_key, model, clip)
+                self.roots[root_key] = node
+            self._touch(node)
+            return node
+
+    def child(self, node, key):
+        with self.lock:
+            child = node.children.get(key, None)
+            if child is not None:
+                self._touch(child)
+            return child
+
+    def _attached(self, node) -> bool:
+        # False when the node was dropped from the tree meanwhile (another base model, evicted lora file)
+        while node.parent is not None:
+            if node.parent.children.get(node.key, None) is not node:
+                return False
+            node = node.parent
+        return self.roots.get(node.key, None) is node
+
+    def add(self, node, key, model, clip):
+        with self.lock:
+            child = PatchedModelNode(node, key, model, clip)
+            if not self._attached(node):
+                return child # not cached, but the caller can still go on from it
+            node.children[key] = child
+            self.nodes_count += 1
+            self._touch(child)
+            self.prune()
+            return child
+
+    def _remove_root(self, root):
+        self.roots.pop(root.key, None)
+        pending = list(root.children.values())
+        while pending:
+            node = pending.pop()
+            self.nodes_count -= 1
+            pending.extend(node.children.values())
+
+    def _remove_subtree(self, node):
+        # remove a patched node and everything below it
+        node.parent.children.pop(node.key, None)
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            self.nodes_count -= 1
+            pending.extend(node.children.values())
+
+    def forget(self, path:str):
+        # drop the patched models built with a lora file (key path of LoraCache), and those built on top of them
+        with self.lock:
+            for root in list(self.roots.values()):
+                pending = list(root.children.values())
+                while pending:
+                    node = pending.pop()
+                    if node.key[0] == path:
+                        self._remove_subtree(node)
+                    else:
+                        pending.extend(node.children.values())
+                if len(root.children) == 0:
+                    self.roots.pop(root.key, None)
+
+    def _remove_leaf(self, node):
+        if node.parent is None:
+            self.roots.pop(node.key, None)
+            return
+        node.parent.children.pop(node.key, None)
+        self.nodes_count -= 1
+        # a base model without patched children is not worth keeping
+        if node.parent.parent is None and len(node.parent.children) == 0:
+            self.roots.pop(node.parent.key, None)
+
+    def _leaves(self):
+        pending = list(self.roots.values())
+        while pending:
+            node = pending.pop()
+            if len(node.children) == 0:
+                if node.parent is not None:
+                    yield node
+            else:
+                pending.extend(node.children.values())
+
+    def prune(self):
+        with self.lock:
+            while self.nodes_count > self.max_nodes:
+                oldest = min(self._leaves(), key=lambda n: n.last_used, default=None)
+                if oldest is None:
+                    break
+                self._remove_leaf(oldest)
+
+    def clear(self):
+        with self.lock:
+            self.roots = {}
+            self.nodes_count = 0
+
+PATCHED_MODELS_CACHE = PatchedModelCache(max_nodes=MAX_PATCHED_MODELS)
@@ -0,0 +1,162 @@
+import torch
+
+import hashlib
+import os
+from pathlib import Path
+
+from ..config_variables import FUSED_LORAS_DIR
+from .logging import logger
+from .lora_index import LORA_INDEX, LORA_KEY_MAPS, convert_lora, convert_key_names, lora_key_prefixes, _model_architecture, _clip_architecture
+from ..scripts.safetensors_file import load_safetensors_mmap
+
+# ===== Fused LoRA stacks ==================================================================================================================
+
+# (up, down) tensor name suffixes of the plain low-rank formats understood by comfy.lora.load_lora
+LOW_RANK_FORMATS = [
+    (".lora_up.weight", ".lora_down.weight"),
+    ("_lora.up.weight", "_lora.down.weight"),
+    (".lora_B.weight", ".lora_A.weight"),
+    (".lora.up.weight", ".lora.down.weight"),
+    (".lora_linear_layer.up.weight", ".lora_linear_layer.down.weight"),
+    (".lora_B", ".lora_A"),
+]
+
+def stack_fingerprint(model, clip, entries) -> str:
+    """Identify a fused stack: model and text encoders architectures (as the key maps, see
+    LoraKeyMapCache), and for each LoRA its file (path, size, mtime) and strengths.
+    entries = [(path, strength_model, strength_clip), ...]"""
+    (key_map, clip_keys) = LORA_KEY_MAPS.get(model, clip)
+    clip_architecture = _clip_architecture(clip)
+    # the text encoders object itself (last item) is not part of a fingerprint kept on disk
+    parts = [repr(_model_architecture(model)), repr(clip_architecture[:-1] if clip_architecture is not None else None),
+             f"{len(key_map)}|{len(clip_keys)}"]
+    for (path, strength_model, strength_clip) in entries:
+        stat = os.stat(path)
+        parts.append(f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{strength_model}|{strength_clip}")
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+
+def low_rank_names(names, key_map:dict):
+    """{lora_key: (up name, down name, alpha name or None)} of the plain low-rank pairs among
+    the tensor names (converted as load_lora_for_models does) for the keys of key_map.
+    Return None if other tensors also target the model (LoHa, LoKr, Tucker mid, DoRA,
+    full diffs ...), which cannot be merged in a plain low-rank patch, or if nothing
+    targets the model at all.
+    """
+    names = set(names)
+    pairs = {}
+    consumed = set()
+    for lora_key in key_map.keys():
+        for (up_suffix, down_suffix) in LOW_RANK_FORMATS:
+            up_name = f"{lora_key}{up_suffix}"
+            down_name = f"{lora_key}{down_suffix}"
+            if up_name in names and down_name in names:
+                alpha_name = f"{lora_key}.alpha"
+                pairs[lora_key] = (up_name, down_name, alpha_name if alpha_name in names else None)
+                consumed.update([up_name, down_name, alpha_name])
+                break
+
+    for key in names:
+        if key in consumed:
+            continue
+        if key in key_map or any(prefix in key_map for prefix in lora_key_prefixes(key)):
+            return None
+    return pairs if len(pairs) > 0 else None
+
+def split_low_rank(lora:dict, key_map:dict):
+    """Decompose a LoRA state dict into {lora_key: (up, down, alpha)} for the keys of key_map.
+    The key names are converted first, as load_lora_for_models does. Return None if it
+    cannot be fused (see low_rank_names): it is then applied on its own, like any other LoRA.
+    """
+    if convert_lora is not None:
+        lora = convert_lora(lora)
+    pairs = low_rank_names(lora.keys(), key_map)
+    if pairs is None:
+        return None
+    return {lora_key: (lora[up_name], lora[down_name], lora[alpha_name].item() if alpha_name is not None else None)
+            for (lora_key, (up_name, down_name, alpha_name)) in pairs.items()}
+
+def is_fusable(path:str, key_map:dict) -> bool:
+    # same decision as split_low_rank, from the file header only (False when it cannot be read)
+    keys = LORA_INDEX.get_tensor_keys(path)
+    if not keys:
+        return False
+    keys = convert_key_names(keys)
+    return keys is not None and low_rank_names(keys, key_map) is not None
+
+def fuse_low_rank(loras, key_map:dict, clip_keys:set) -> dict:
+    """Merge several LoRAs into a single one, with one patch per target weight.
+
+    loras = [(state dict, strength_model, strength_clip), ...] (see split_low_rank).
+    For each target weight the up tensors (scaled by strength * alpha / rank) and the
+    down tensors are concatenated along the rank: the product of the fused pair is
+    exactly the sum of the deltas of the stack, while staying low-rank. The fused
+    alpha equals the fused rank, so it is applied with strength 1.0.
+    Return None if the tensors of a target cannot be concatenated (different kernel shapes).
+    """
+    dtype = loras_dtype(loras)
+    groups = {} # target weight -> (lora key, [(scaled up, down), ...])
+    for (parts, strength_model, strength_clip) in loras:
+        for (lora_key, (up, down, alpha)) in parts.items():
+            strength = strength_clip if lora_key in clip_keys else strength_model
+            rank = down.shape[0]
+            scale = strength * (alpha / rank if alpha is not None else 1.0)
+            target = key_map[lora_key]
+            (_, pairs) = groups.setdefault(target, (lora_key, []))
+            pairs.append((up.float() * scale, down.float()))
+
+    fused = {}
+    for (target, (lora_key, pairs)) in groups.items():
+        ups = [up for (up, _) in pairs]
+        downs = [down for (_, down) in pairs]
+        if any(up.shape[0] != ups[0].shape[0] or up.shape[2:] != ups[0].shape[2:] for up in ups) or \
+           any(down.shape[1:] != downs[0].shape[1:] for down in downs):
+            logger.info(f"LoraFuse : cannot merge the tensors of {lora_key}")
+            return None
+        up = torch.cat(ups, dim=1).to(dtype)
+        down = torch.cat(downs, dim=0).to(dtype)
+        fused[f"{lora_key}.lora_up.weight"] = up.contiguous()
+        fused[f"{lora_key}.lora_down.weight"] = down.contiguous()
+        fused[f"{lora_key}.alpha"] = torch.tensor(float(down.shape[0]))
+    return fused
+
+def loras_dtype(loras):
+    # storage dtype of the fused LoRA: the one of the first up tensor of the stack
+    for (parts, _, _) in loras:
+        for (up, _, _) in parts.values():
+            return up.dtype
+    return torch.float16
+
+def build_key_maps(model, clip) -> (dict, set):
+    # lora key -> model weight for model and clip, and the set of the clip keys
+    return LORA_KEY_MAPS.get(model, clip)
+
+def fused_on_disk(fingerprint:str) -> bool:
+    return bool(FUSED_LORAS_DIR) and (Path(FUSED_LORAS_DIR) / f"{fingerprint}.safetensors").is_file()
+
+def load_fused_from_disk(fingerprint:str):
+    if not FUSED_LORAS_DIR:
+        return None
+    path = Path(FUSED_LORAS_DIR) / f"{fingerprint}.safetensors"
+    if not path.is_file():
+        return None
+    try:
+        return load_safetensors_mmap(path)
+    except Exception as e:
+        logger.warning(f"LoraFuse : cannot read {path} - {e}")
+        return None
+
+def save_fused_to_disk(fingerprint:str, fused:dict):
+    if not FUSED_LORAS_DIR:
+        return
+    from safetensors.torch import save_file
+
+    directory = Path(FUSED_LORAS_DIR)
+    path = directory / f"{fingerprint}.safetensors"
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        save_file(fused, str(tmp_path))
+        os.replace(tmp_path, path)
+        logger.info(f"LoraFuse : saved {path}")
+    except Exception as e:
+        logger.warning(f"LoraFuse : cannot save {path} - {e}")
@@ -0,0 +1,285 @@
+import comfy.lora
+import folder_paths
+
+try:
+    from comfy.lora_convert import convert_lora
+except ImportError:
+    convert_lora = None # older ComfyUI: the lora formats are all handled by comfy.lora.load_lora
+
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .logging import logger
+from ..scripts.safetensors_file import read_safetensors_header, summarize_safetensors_header, is_safetensors_file
+
+# ===== LoRA library index =================================================================================================================
+
+# number of threads reading the headers (most of the time is spent waiting on the storage)
+INDEX_WORKERS = 16
+
+class LoraIndex():
+    """Header-only description of the LoRA files (see summarize_safetensors_header).
+
+    Only the 8-byte length prefix and the JSON header of each .safetensors file are
+    read, never the tensors. Entries are keyed by absolute path and revalidated with
+    the file size and mtime, so a refresh only re-reads the files that changed.
+    """
+    def __init__(self):
+        self.entries = {} # path -> (size, mtime, info)
+        self.keys = {}    # path -> (size, mtime, tensor keys), only for the files checked by ApplyLoraStack
+        self.lock = threading.Lock()
+
+    def get_info(self, path:str):
+        # info of a single file (read on demand), None if it is not a readable safetensors file
+        if path is None or not is_safetensors_file(path):
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self.lock:
+            cached = self.entries.get(path, None)
+        if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime:
+            return cached[2]
+        try:
+            (header, _) = read_safetensors_header(path)
+            info = summarize_safetensors_header(header)
+        except Exception as e:
+            logger.warning(f"LoraIndex : cannot read header of {path} - {e}")
+            return None
+        info["file_bytes"] = stat.st_size
+        with self.lock:
+            self.entries[path] = (stat.st_size, stat.st_mtime, info)
+        return info
+
+    def get_tensor_keys(self, path:str):
+        # names of the tensors of a file (read on demand), None if it is not a readable safetensors file
+        if path is None or not is_safetensors_file(path):
+            return None
+        try:
+            stat = os.stat(path)
+            with self.lock:
+                cached = self.keys.get(path, None)
+            if cached is not None and cached[0] == stat.st_size and cached[1] == stat.st_mtime:
+                return cached[2]
+            (header, _) = read_safetensors_header(path)
+        except Exception as e:
+            logger.warning(f"LoraIndex : cannot read header of {path} - {e}")
+            return None
+        keys = [key for key in header.keys() if key != "__metadata__"]
+        with self.lock:
+            self.keys[path] = (stat.st_size, stat.st_mtime, keys)
+        return keys
+
+    def get_bytes(self, path:str) -> int:
+        info = self.get_info(path)
+        return 0 if info is None else info["bytes"]
+
+    def get_loras_info(self, names:list) -> dict:
+        # name -> info for every .safetensors name of the loras folders
+        names = [name for name in names if is_safetensors_file(name)]
+        paths = [folder_paths.get_full_path("loras", name) for name in names]
+        with ThreadPoolExecutor(max_workers=INDEX_WORKERS, thread_name_prefix="ntx-lora-index") as executor:
+            infos = list(executor.map(self.get_info, paths))
+        result = {}
+        for (name, info) in zip(names, infos):
+            if info is not None:
+                result[name] = info
+        # forget the files that are no longer in the loras folders
+        scanned = set(paths)
+        with self.lock:
+            for path in [path for path in self.entries.keys() if not path in scanned]:
+                del self.entries[path]
+            for path in [path for path in self.keys.keys() if not path in scanned]:
+                del self.keys[path]
+        return result
+
+LORA_INDEX = LoraIndex()
+
+# ===== LoRA list versions =================================================================================================================
+
+# number of previous lists kept to answer the "since" requests with a delta
+MAX_LIST_VERSIONS = 16
+
+class LoraListVersions():
+    """Version of the list of the LoRA names, for the list endpoints.
+
+    The version is a digest of the sorted names: a client holding a version can be
+    answered "not modified", or only with the names added and removed since then
+    (as long as that version is one of the last MAX_LIST_VERSIONS lists).
+    """
+    def __init__(self, max_versions:int):
+        self.max_versions = max_versions
+        self.history = OrderedDict() # version -> frozenset of names
+        self.last_source = None
+        self.version = ""
+        self.lock = threading.Lock()
+
+    def update(self, names:list, source=None) -> str:
+        # record the current list (as returned by folder_paths), return its version; source is the entry of
+        # folder_paths.filename_list_cache the names come from: the same tuple is kept as long as the scan
+        # is valid (a copy of its names is returned every time), so the digest is only computed on a change
+        with self.lock:
+            if source is not None and source is self.last_source:
+                return self.version
+            digest = hashlib.sha1("\n".join(sorted(names)).encode("utf-8")).hexdigest()[:16]
+            if not digest in self.history:
+                self.history[digest] = frozenset(names)
+                while len(self.history) > self.max_versions:
+                    self.history.popitem(last=False)
+            self.last_source = source
+            self.version = digest
+            return digest
+
+    def delta(self, since:str):
+        # (added, removed) names between version "since" and the current one, None if that version is unknown
+        with self.lock:
+            previous = self.history.get(since, None)
+            current = self.history.get(self.version, None)
+        if previous is None or current is None:
+            return None
+        return (sorted(current - previous), sorted(previous - current))
+
+LORA_LIST_VERSIONS = LoraListVersions(MAX_LIST_VERSIONS)
+
+# ===== LoRA key maps ======================================================================================================================
+
+# number of architectures (model + clip combinations) whose key maps are kept
+MAX_KEY_MAPS = 8
+
+def _model_architecture(model):
+    # the lora key names of a diffusion model only depend on its class and its unet config
+    if model is None:
+        return None
+    model_config = getattr(model.model, "model_config", None)
+    unet_config = getattr(model_config, "unet_config", None) or {}
+    return (type(model.model).__qualname__, type(model_config).__qualname__, repr(sorted(unet_config.items(), key=lambda item: str(item[0]))))
+
+def _clip_architecture(clip):
+    # text encoders: class of the wrapper, its sub-models, and the text encoders object itself (shared by
+    # the clones of a clip): walking its weights to tell apart the sizes of a same family would cost about
+    # as much as building the key map. A weak reference, so that a new object cannot match after an id reuse
+    if clip is None:
+        return None
+    cond_stage_model = clip.cond_stage_model
+    children = tuple((name, type(child).__qualname__) for (name, child) in cond_stage_model.named_children())
+    return (type(cond_stage_model).__qualname__, children, weakref.ref(cond_stage_model))
+
+class LoraKeyMapCache():
+    """Mapping lora key name -> model / clip weight name, by architecture.
+
+    comfy.sd.load_lora_for_models rebuilds this mapping for every LoRA it applies,
+    while it only depends on the model class/config and on the text encoders: it is
+    built once per architecture (once per loaded text encoders for the clip part)
+    and reused by all the LoRAs of all the prompts.
+    The maps are shared, they must not be modified.
+    """
+    def __init__(self, max_entries:int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # (model architecture, clip architecture) -> (key_map, clip_keys)
+        self.lock = threading.Lock()
+
+    def get(self, model, clip) -> (dict, set):
+        # (lora key -> weight name for model and clip, set of the clip lora keys)
+        key = (_model_architecture(model), _clip_architecture(clip))
+        with self.lock:
+            cached = self.entries.get(key, None)
+            if cached is not None:
+                self.entries.move_to_end(key)
+                return cached
+        key_map = {}
+        if model is not None:
+            key_map = comfy.lora.model_lora_keys_unet(model.model, key_map)
+        clip_keys = set()
+        if clip is not None:
+            clip_map = comfy.lora.model_lora_keys_clip(clip.cond_stage_model, {})
+            clip_keys = set(clip_map.keys())
+            key_map.update(clip_map)
+        with self.lock:
+            self.entries[key] = (key_map, clip_keys)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        logger.info(f"LoraKeyMapCache : key map built for {key[0][0] if key[0] else 'no model'} / {key[1][0] if key[1] else 'no clip'} ({len(key_map)} keys)")
+        return (key_map, clip_keys)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+LORA_KEY_MAPS = LoraKeyMapCache(MAX_KEY_MAPS)
+
+def load_lora_for_models(model, clip, lora:dict, strength_model:float, strength_clip:float):
+    """Same as comfy.sd.load_lora_for_models, using the cached key maps."""
+    (key_map, _) = LORA_KEY_MAPS.get(model, clip)
+    if convert_lora is not None:
+        lora = convert_lora(lora)
+    loaded = comfy.lora.load_lora(lora, key_map)
+
+    new_model = None
+    applied = set()
+    if model is not None:
+        new_model = model.clone()
+        applied.update(new_model.add_patches(loaded, strength_model))
+    new_clip = None
+    if clip is not None:
+        new_clip = clip.clone()
+        applied.update(new_clip.add_patches(loaded, strength_clip))
+    for key in loaded:
+        if not key in applied:
+            logger.warning(f"NOT LOADED {key}")
+    return (new_model, new_clip)
+
+# ===== LoRA compatibility =================================================================================================================
+
+def build_lora_key_map(model, clip) -> dict:
+    # same mapping comfy.sd.load_lora_for_models builds: lora key name -> model / clip weight name
+    return LORA_KEY_MAPS.get(model, clip)[0]
+
+def lora_key_prefixes(key:str):
+    # "lora_unet_x.lora_up.weight" -> "lora_unet_x.lora_up", "lora_unet_x" ...
+    # (the lora key names are the model key names followed by up to 3 components like .lora_up.weight)
+    for _ in range(3):
+        if not "." in key:
+            return
+        key = key.rsplit(".", 1)[0]
+        yield key
+        if key.endswith("_lora"): # "x_lora.up.weight" format
+            yield key[:-len("_lora")]
+
+def convert_key_names(keys:list):
+    # tensor names as renamed by comfy.lora_convert.convert_lora (applied by load_lora_for_models),
+    # None when they cannot be converted without the tensors
+    if convert_lora is None:
+        return keys
+    try:
+        return list(convert_lora(dict.fromkeys(keys)).keys())
+    except Exception:
+        return None
+
+def is_lora_compatible(path:str, key_map:dict) -> bool:
+    """Tell from the header only whether a LoRA targets any weight of the model/clip.
+
+    A LoRA is incompatible when none of its tensors matches an entry of the key map
+    (typically a LoRA trained for another architecture, which would silently apply
+    nothing). The tensor names are first renamed as load_lora_for_models does (e.g.
+    the Flux control LoRAs of BFL). Files whose header cannot be read, or whose names
+    cannot be converted from the header alone, are assumed to be compatible and left
+    to the normal loader.
+    """
+    keys = LORA_INDEX.get_tensor_keys(path)
+    if keys is None or len(keys) == 0 or len(key_map) == 0:
+        return True
+    keys = convert_key_names(keys)
+    if keys is None:
+        return True
+    for key in keys:
+        if key in key_map:
+            return True
+        for prefix in lora_key_prefixes(key):
+            if prefix in key_map:
+                return True
+    return False
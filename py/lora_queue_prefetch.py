@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+
+from ..config_variables import ADDON_PREFIX, PREFETCH_LORAS, QUEUE_PREFETCH_DEPTH
+from .logging import logger
+from .lora_cache import prefetch_loras
+from .loras import extract_lora_strings, parse_loras_data
+
+# ===== Prefetch from the prompt queue =====================================================================================================
+
+# seconds between two looks at the queue
+QUEUE_PREFETCH_INTERVAL = 2.0
+# number of prompt ids remembered as already prefetched
+MAX_SEEN_PROMPTS = 256
+
+QUEUE_PREFETCH_THREAD = None
+
+def loras_of_prompt(prompt:dict) -> list:
+    """LoRAs a queued prompt will need, as a lora stack, from the inputs of its nodes:
+    - LoraStack : the loras_data widget
+    - ConvertLoraStringToStack : the <lora:...> tags of the prompt text (when it is not linked)
+    """
+    lora_stack = []
+    for node in prompt.values():
+        if not isinstance(node, dict):
+            continue
+        class_type = node.get("class_type", "")
+        inputs = node.get("inputs", {}) or {}
+        try:
+            if class_type == f"{ADDON_PREFIX}LoraStack" and isinstance(inputs.get("loras_data", None), str):
+                lora_stack.extend(parse_loras_data(inputs["loras_data"]))
+            elif class_type == f"{ADDON_PREFIX}ConvertLoraStringToStack" and isinstance(inputs.get("prompt", None), str):
+                lora_stack.extend(extract_lora_strings(inputs["prompt"]))
+        except Exception as e:
+            logger.warning(f"QueuePrefetch : cannot read the loras of node {class_type} - {e}")
+    return lora_stack
+
+def _pending_prompts(prompt_queue, depth:int) -> list:
+    # (prompt id, prompt) of the next pending prompts, in execution order
+    if hasattr(prompt_queue, "get_current_queue_volatile"):
+        (_, pending) = prompt_queue.get_current_queue_volatile()
+    else:
+        with prompt_queue.mutex:
+            pending = list(prompt_queue.queue)
+    # queue items: (number, prompt_id, prompt, extra_data, outputs_to_execute, ...)
+    pending = sorted(pending, key=lambda item: item[0])[:depth]
+    return [(item[1], item[2]) for item in pending]
+
+def _watch_queue():
+    from server import PromptServer
+
+    seen = OrderedDict() # prompt ids already prefetched
+    while True:
+        time.sleep(QUEUE_PREFETCH_INTERVAL)
+        try:
+            for (prompt_id, prompt) in _pending_prompts(PromptServer.instance.prompt_queue, QUEUE_PREFETCH_DEPTH):
+                if prompt_id in seen:
+                    continue
+                seen[prompt_id] = True
+                while len(seen) > MAX_SEEN_PROMPTS:
+                    seen.popitem(last=False)
+                lora_stack = loras_of_prompt(prompt)
+                if len(lora_stack) > 0:
+                    logger.info(f"QueuePrefetch : prompt {prompt_id} - {len(lora_stack)} loras")
+                    prefetch_loras(lora_stack)
+        except Exception as e:
+            logger.warning(f"QueuePrefetch : {e}")
+
+def start_queue_prefetch():
+    """Warm the LoRA cache with the LoRAs of the next pending prompts of the queue
+    (the first cache.queue_prefetch_depth ones), while the current prompt runs.
+    The queue is polled by a background thread, started only once."""
+    global QUEUE_PREFETCH_THREAD
+    if QUEUE_PREFETCH_THREAD is not None or not PREFETCH_LORAS or QUEUE_PREFETCH_DEPTH <= 0:
+        return
+    QUEUE_PREFETCH_THREAD = threading.Thread(target=_watch_queue, name="ntx-queue-prefetch", daemon=True)
+    QUEUE_PREFETCH_THREAD.start()
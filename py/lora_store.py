@@ -0,0 +1,275 @@
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # not available on Windows: the shared store is disabled
+
+from .logging import logger
+from ..scripts.safetensors_file import load_safetensors_mmap
+
+# ===== Host-wide shared LoRA store ========================================================================================================
+
+def lora_file_key(path:str) -> str:
+    # identify a version of a file: a new version of the source file gets a new copy
+    stat = os.stat(path)
+    return hashlib.sha1(f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}".encode("utf-8")).hexdigest()
+
+def _process_alive(pid:int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class SharedLoraStore():
+    """LoRA files shared by all the ComfyUI processes of a host.
+
+    Each LoRA is written once, as a .safetensors copy, in a directory common to all
+    the processes (ideally on tmpfs, e.g. /dev/shm), and every process memory-maps
+    that copy: the tensors then live in shared pages, so N workers using the same
+    LoRA hold a single copy in RAM.
+
+    registry.json (guarded by an flock on registry.lock) records for each copy the
+    source file, its size, the pids using it and the last use. Copies not used by
+    any live process are deleted, least recently used first, when the total goes
+    over max_bytes. As for LoraDiskCache, the copies are also keyed on a tag of the
+    conversion, so processes converting differently do not map each other's copies.
+    """
+    def __init__(self, directory:str, max_bytes:int, tag:str=""):
+        self.directory = Path(directory) if directory else None
+        self.max_bytes = max_bytes
+        self.tag = tag
+        self.pid = os.getpid()
+        if self.directory is not None and fcntl is None:
+            logger.warning("SharedLoraStore : not supported on this platform, disabled")
+            self.directory = None
+        if self.directory is not None:
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+            except Exception as e:
+                logger.warning(f"SharedLoraStore : cannot create {self.directory}, disabled - {e}")
+                self.directory = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    @contextmanager
+    def _registry(self):
+        # exclusive access to the registry, which is saved back when the block ends
+        with open(self.directory / "registry.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                registry_path = self.directory / "registry.json"
+                try:
+                    registry = json.loads(registry_path.read_text(encoding="utf-8"))
+                except (FileNotFoundError, ValueError):
+                    registry = {}
+                yield registry
+                tmp_path = registry_path.with_suffix(f".{self.pid}.tmp")
+                tmp_path.write_text(json.dumps(registry), encoding="utf-8")
+                os.replace(tmp_path, registry_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def entry_key(self, path:str) -> str:
+        return hashlib.sha1(f"{lora_file_key(path)}|{self.tag}".encode("utf-8")).hexdigest()
+
+    def _file(self, key:str) -> Path:
+        return self.directory / f"{key}.safetensors"
+
+    def _prune(self, registry:dict, extra_bytes:int=0):
+        for entry in registry.values():
+            entry["refs"] = [pid for pid in entry["refs"] if _process_alive(pid)]
+        total = sum(entry["bytes"] for entry in registry.values())
+        for key in sorted(registry.keys(), key=lambda k: registry[k]["last_used"]):
+            if total + extra_bytes <= self.max_bytes:
+                break
+            if len(registry[key]["refs"]) > 0:
+                continue
+            total -= registry[key]["bytes"]
+            del registry[key]
+            try:
+                self._file(key).unlink()
+            except FileNotFoundError:
+                pass
+            logger.info(f"SharedLoraStore : removed {key}")
+
+    def acquire(self, path:str):
+        # memory-mapped state dict of the shared copy of a file, or None if there is no copy yet
+        key = self.entry_key(path)
+        with self._registry() as registry:
+            if not self._use_existing(registry, key):
+                registry.pop(key, None)
+                return (key, None)
+        try:
+            return (key, load_safetensors_mmap(self._file(key)))
+        except Exception:
+            # this process was added to the users of the copy: taken back
+            self.release(key)
+            raise
+
+    def _use_existing(self, registry:dict, key:str) -> bool:
+        # add this process to the users of a copy already published, False if there is none
+        entry = registry.get(key, None)
+        if entry is None or not self._file(key).is_file():
+            return False
+        if not self.pid in entry["refs"]:
+            entry["refs"].append(self.pid)
+        entry["last_used"] = time.time()
+        return True
+
+    def _fits(self, registry:dict, path:str, size:int) -> bool:
+        # make room for size more bytes, False if the copies in use leave too little
+        self._prune(registry, size)
+        if sum(entry["bytes"] for entry in registry.values()) + size > self.max_bytes:
+            logger.info(f"SharedLoraStore : no room for {path}")
+            return False
+        return True
+
+    def publish(self, path:str, key:str, state_dict:dict):
+        # write the shared copy of a file and map it; return None if it does not fit the budget
+        from safetensors.torch import save_file
+
+        size = sum(value.numel() * value.element_size() for value in state_dict.values())
+        with self._registry() as registry:
+            if self._use_existing(registry, key):
+                return load_safetensors_mmap(self._file(key))
+            if not self._fits(registry, path, size):
+                return None
+
+        # written outside of the lock (it can take a while)
+        tmp_path = self._file(key).with_suffix(f".{self.pid}.tmp")
+        save_file({k: v.contiguous() for (k, v) in state_dict.items()}, str(tmp_path))
+
+        # another process may have published the same file, or used the room meanwhile: checked again
+        # under the lock, and the copy only becomes visible (atomic rename) once registered
+        published = False
+        try:
+            with self._registry() as registry:
+                if self._use_existing(registry, key):
+                    logger.info(f"SharedLoraStore : {path} published by another process")
+                elif self._fits(registry, path, size):
+                    os.replace(tmp_path, self._file(key))
+                    registry[key] = {"source": str(path), "bytes": size, "refs": [self.pid], "last_used": time.time()}
+                    published = True
+                else:
+                    return None
+        finally:
+            try:
+                tmp_path.unlink()
+            except FileNotFoundError:
+                pass
+        if published:
+            logger.info(f"SharedLoraStore : added {path}")
+        return load_safetensors_mmap(self._file(key))
+
+    def release(self, key:str):
+        # this process no longer uses the copy (it stays available to the others)
+        with self._registry() as registry:
+            entry = registry.get(key, None)
+            if entry is not None and self.pid in entry["refs"]:
+                entry["refs"].remove(self.pid)
+            self._prune(registry)
+
+# ===== Persistent LoRA disk cache =========================================================================================================
+
+class LoraDiskCache():
+    """Local copies of the LoRA files, ready to be memory-mapped.
+
+    Each LoRA read from its source (typically a slow network storage) is written
+    once in the directory as a .safetensors copy, already converted by the caller
+    (normalised key names, cache dtype): the next loads, including after a restart
+    or on another pod sharing the volume, only map that copy. Copies are keyed by
+    source path, size and mtime plus a tag of the conversion (e.g. the dtype), so
+    a modified source or another setting gets a new copy. The modification time of
+    a copy is its last use: the least recently used copies are deleted when the
+    directory goes over max_bytes.
+    """
+    def __init__(self, directory:str, max_bytes:int, tag:str=""):
+        self.directory = Path(directory) if directory else None
+        self.max_bytes = max_bytes
+        self.tag = tag
+        if self.directory is not None:
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+            except Exception as e:
+                logger.warning(f"LoraDiskCache : cannot create {self.directory}, disabled - {e}")
+                self.directory = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def _file(self, path:str) -> Path:
+        key = hashlib.sha1(f"{lora_file_key(path)}|{self.tag}".encode("utf-8")).hexdigest()
+        return self.directory / f"{key}.safetensors"
+
+    def load(self, path:str):
+        # memory-mapped state dict of the copy of a file, None if there is no copy (or it cannot be read)
+        file = self._file(path)
+        if not file.is_file():
+            return None
+        try:
+            lora = load_safetensors_mmap(file)
+            os.utime(file) # last use, for the LRU cleanup
+            return lora
+        except Exception as e:
+            logger.warning(f"LoraDiskCache : cannot read {file}, removed - {e}")
+            try:
+                file.unlink()
+            except OSError:
+                pass
+            return None
+
+    def save(self, path:str, state_dict:dict):
+        # write the copy of a file and map it; None if it cannot be written or does not fit the budget
+        from safetensors.torch import save_file
+
+        size = sum(value.numel() * value.element_size() for value in state_dict.values())
+        if size > self.max_bytes:
+            logger.info(f"LoraDiskCache : {path} is larger than the cache")
+            return None
+        file = self._file(path)
+        tmp_path = file.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.prune(size)
+            save_file({k: v.contiguous() for (k, v) in state_dict.items()}, str(tmp_path))
+            os.replace(tmp_path, file)
+        except Exception as e:
+            logger.warning(f"LoraDiskCache : cannot save {path} - {e}")
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+            return None
+        logger.info(f"LoraDiskCache : added {path}")
+        return load_safetensors_mmap(file)
+
+    def prune(self, extra_bytes:int=0):
+        # delete the least recently used copies until extra_bytes more fit the budget
+        files = []
+        for file in self.directory.glob("*.safetensors"):
+            try:
+                stat = file.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+        total = sum(size for (_, size, _) in files)
+        for (_, size, file) in sorted(files, key=lambda f: f[0]):
+            if total + extra_bytes <= self.max_bytes:
+                break
+            try:
+                file.unlink() # a copy mapped by a process stays readable by it until unmapped
+            except OSError:
+                continue
+            total -= size
+            logger.info(f"LoraDiskCache : removed {file.name}")
@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import deque
+
+from .logging import logger
+from .lora_cache import format_bytes
+
+# ===== ApplyLoraStack telemetry ===========================================================================================================
+
+# number of per-LoRA records kept in memory (the oldest are dropped first)
+MAX_TELEMETRY_RECORDS = 1000
+
+def current_prompt_id():
+    # id of the prompt being executed, None outside of an execution
+    try:
+        from server import PromptServer
+        return getattr(PromptServer.instance, "last_prompt_id", None)
+    except Exception:
+        return None
+
+def summarize_records(records:list) -> dict:
+    # totals of a set of records (typically those of a prompt); the downloads run in parallel,
+    # so their wall time is the longest one, not the sum
+    return {
+        "loras": len(records),
+        "hits": sum(1 for record in records if record["hit"] is True),
+        "misses": sum(1 for record in records if record["hit"] is False),
+        "bytes": sum(record["bytes"] for record in records),
+        "resolve_s": sum(record["resolve_s"] for record in records),
+        "download_s": max([record["download_s"] for record in records] or [0.0]),
+        "load_s": sum(record["load_s"] for record in records),
+        "patch_s": sum(record["patch_s"] for record in records),
+    }
+
+def format_summary(summary:dict) -> str:
+    return (f"{summary['loras']} loras ({summary['hits']} hits, {summary['misses']} misses, {format_bytes(summary['bytes'])} read) - "
+            f"resolve {summary['resolve_s']:.2f} s, download {summary['download_s']:.2f} s, "
+            f"load {summary['load_s']:.2f} s, patch {summary['patch_s']:.2f} s")
+
+class LoraTelemetry():
+    """Measurements of ApplyLoraStack, one record per LoRA entry of each run:
+    - prompt_id, time, lora (name), path, status (applied, reused, fused, not found, incompatible, error ...)
+    - source     : where the weights came from (cache message)
+    - hit        : True when no file was read (cache or patched model), False when read, None if not loaded
+    - bytes      : bytes of weights read on a miss
+    - resolve_s, download_s, load_s, patch_s : durations in seconds
+
+    The records are kept in a ring buffer; the records of each run are added at once.
+    """
+    def __init__(self, max_records:int):
+        self.records = deque(maxlen=max_records)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def new_record(lora_name:str, prompt_id=None, **values) -> dict:
+        record = {
+            "prompt_id": prompt_id,
+            "time": time.time(),
+            "lora": lora_name,
+            "path": None,
+            "status": "",
+            "source": "",
+            "hit": None,
+            "bytes": 0,
+            "resolve_s": 0.0,
+            "download_s": 0.0,
+            "load_s": 0.0,
+            "patch_s": 0.0,
+        }
+        record.update(values)
+        return record
+
+    def add(self, records:list):
+        # add the records of a run, and log their summary
+        if len(records) == 0:
+            return
+        with self.lock:
+            self.records.extend(records)
+        logger.info(f"Timings : {format_summary(summarize_records(records))}")
+
+    def describe(self, prompt_id=None, limit:int=None) -> dict:
+        # records (oldest first, optionally only those of a prompt and only the last ones) and the summary of each prompt
+        with self.lock:
+            records = [dict(record) for record in self.records]
+        if prompt_id is not None:
+            records = [record for record in records if record["prompt_id"] == prompt_id]
+        if limit is not None:
+            records = records[-limit:] if limit > 0 else []
+        prompts = {}
+        for record in records:
+            prompts.setdefault(str(record["prompt_id"]), []).append(record)
+        return {
+            "records": records,
+            "prompts": {key: summarize_records(value) for (key, value) in prompts.items()},
+        }
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+LORA_TELEMETRY = LoraTelemetry(MAX_TELEMETRY_RECORDS)
@@ -1,25 +1,28 @@
 from comfy_api.latest import ComfyExtension, io
 
-import comfy.sd
-import comfy.utils
 import folder_paths
 
+import asyncio
 import json
 import os
 import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing_extensions import override
 
-from ..config_variables import ADDON_NAME, ADDON_PREFIX, ADDON_CATEGORY, API_PREFIX, MODELS_DIR, MAX_CACHED_LORAS, DOWNLOAD_MISSING_LORAS, CLOUD_STORAGE_ID
+from ..config_variables import ADDON_NAME, ADDON_PREFIX, ADDON_CATEGORY, API_PREFIX, MODELS_DIR, DOWNLOAD_MISSING_LORAS, CLOUD_STORAGE_ID, CLOUD_DOWNLOAD_WORKERS, CHECK_LORA_COMPATIBILITY, LORA_DUPLICATES
 from .logging import logger
-from .utils import clone_data, download_file_from_cloud, load_list_loras, find_model_file, notify_user, LORA_STACK_TYPE
+from .lora_cache import LORA_CACHE, PATCHED_MODELS_CACHE, prefetch_loras, state_dict_bytes
+from .lora_index import LORA_INDEX, LORA_LIST_VERSIONS, build_lora_key_map, is_lora_compatible, load_lora_for_models
+from .model_index import MODEL_INDEX
+from .lora_telemetry import LORA_TELEMETRY, current_prompt_id
+from .lora_fuse import stack_fingerprint, split_low_rank, fuse_low_rank, build_key_maps, is_fusable, fused_on_disk, load_fused_from_disk, save_fused_to_disk
+from .utils import clone_data, download_file_from_cloud, load_list_loras, resolve_models, notify_user, LORA_STACK_TYPE
 
 # ===== LoRA utilities =================================================================================================================
 
-# used by ApplyLoraStack
-CACHED_LORAS = []
-logger.info(f"MAX_CACHED_LORAS = {MAX_CACHED_LORAS}")
-
 def normalize_lora_name(lora_name:str):
     if Path(lora_name).suffix == "":
         lora_name += ".safetensors"
@@ -58,6 +61,35 @@ def extract_lora_strings(text):
 
     return loras_stack
 
+def parse_loras_data(loras_data:str) -> list:
+    # entries of the loras_data widget of LoraStack, as a lora stack (disabled rows and rows set to none are skipped)
+    try:
+        data = json.loads(loras_data)
+        if isinstance(data, list):
+            # backward-compat: old format was a bare array
+            loras, common_strength = data, False
+        elif isinstance(data, dict):
+            loras = data.get("loras", [])
+            common_strength = bool(data.get("commonStrength", False))
+        else:
+            loras, common_strength = [], False
+    except (json.JSONDecodeError, TypeError):
+        loras, common_strength = [], False
+
+    stack = []
+    for entry in loras:
+        if not isinstance(entry, dict):
+            continue
+        if not entry.get("enabled", True):
+            continue
+        name = entry.get("name", "")
+        if not name or name == "none":
+            continue
+        model_str = float(entry.get("modelStrength", 1.0))
+        clip_str  = model_str if common_strength else float(entry.get("clipStrength", 1.0))
+        stack.append((name, model_str, clip_str))
+    return stack
+
 def remove_text_between_angle_brackets(text):
     """
     Remove all text between < and > from the input string
@@ -85,6 +117,123 @@ def format_lora_as_string(lora_name, strength_model, strength_clip, compact_form
     else:
         return f"<lora:{lora_name}:{strength_model}:{strength_clip}>"
 
+def _download_lora_file(lora_name:str):
+    # download a missing lora from the cloud storage, return the file path (None on failure, the user is notified)
+    lora_name = normalize_lora_name(lora_name)
+    save_path = MODELS_DIR / "loras" / Path(lora_name)
+    (dl_result, dl_message) = download_file_from_cloud(
+            cloud_storage_id=CLOUD_STORAGE_ID, 
+            model_subpath="loras" / Path(lora_name), 
+            save_path=save_path
+        )
+    if dl_result:
+        # success: proceed with next steps
+        logger.info(f"- [{lora_name}] {dl_message}")
+        return (lora_name, str(save_path))
+
+    # failure: stop
+    notify_user("warn", "ApplyLoraStack", f"[{lora_name}] model file not found and unable to download from cloud")
+    logger.warning(f"- ERROR [{lora_name}] {dl_message}")
+    return (lora_name, None)
+
+def _timed_download_lora_file(lora_name:str):
+    start = time.perf_counter()
+    result = _download_lora_file(lora_name)
+    return (result, time.perf_counter() - start)
+
+def resolve_lora_files(lora_names:list, timings:dict=None) -> dict:
+    """Find the files of a list of loras: return {requested name: (actual lora name, file path)},
+    the path being None when the file is not available (the user is notified).
+    The durations of the search and of the download are added to timings when given,
+    as {requested name: {"resolve_s": ..., "download_s": ...}}.
+
+    Missing files are downloaded from the cloud storage when configured: all the downloads
+    are started together (at most CLOUD_DOWNLOAD_WORKERS rclone processes at a time), so the
+    wait is the one of the slowest download instead of the sum of all of them.
+    """
+    if timings is None:
+        timings = {}
+    # all the names are resolved together (see resolve_models), the time is shared among them
+    lora_names = list(dict.fromkeys(lora_names))
+    start = time.perf_counter()
+    found = resolve_models([("loras", lora_name) for lora_name in lora_names])
+    resolve_s = (time.perf_counter() - start) / max(1, len(lora_names))
+    resolved = {}
+    missing = []
+    for (lora_name, (lora_name_found, lora_path, _)) in zip(lora_names, found):
+        resolved[lora_name] = (lora_name_found, lora_path)
+        timings[lora_name] = {"resolve_s": resolve_s, "download_s": 0.0}
+        if lora_path is None:
+            missing.append(lora_name)
+
+    if len(missing) == 0:
+        return resolved
+
+    # lora files not present, try to get them from cloud or raise an error
+    if (CLOUD_STORAGE_ID == "") or (DOWNLOAD_MISSING_LORAS == False):  
+        # download from cloud is not required or not possible: just notify the error
+        for lora_name in missing:
+            msg = f"[{resolved[lora_name][0]}] model file not found"
+            notify_user("warn", "ApplyLoraStack", msg)           
+            logger.warning("- ERROR " + msg)
+        return resolved
+
+    # one download per file: the spellings of a same file (ILL/foo, ILL\foo.safetensors ...) share it
+    downloads = {} # normalized name -> requested names
+    for lora_name in missing:
+        downloads.setdefault(normalize_lora_name(resolved[lora_name][0]), []).append(lora_name)
+    logger.warning(f"- {len(downloads)} model files not found, attempting to download from {CLOUD_STORAGE_ID} : {', '.join(downloads.keys())}")
+    with ThreadPoolExecutor(max_workers=max(1, CLOUD_DOWNLOAD_WORKERS), thread_name_prefix="ntx-lora-download") as executor:
+        results = executor.map(_timed_download_lora_file, list(downloads.keys()))
+        for (lora_names, (result, duration)) in zip(downloads.values(), results):
+            for lora_name in lora_names:
+                resolved[lora_name] = result
+                timings[lora_name]["download_s"] = duration
+    return resolved
+
+def combine_strengths(first:float, second:float, policy:str) -> float:
+    # strength of two entries of a stack using the same file
+    if policy == "sum":
+        return first + second
+    if policy == "max":
+        # largest effect, whatever its sign
+        return first if abs(first) >= abs(second) else second
+    return first
+
+def normalize_lora_stack(lora_stack, resolved:dict, policy:str="first") -> list:
+    """Canonical form of a lora stack, before any lora file is read:
+    [(lora name, file path, strength_model, strength_clip), ...]
+
+    resolved is the result of resolve_lora_files for the names of the stack. Entries
+    using the same file (whatever the spelling of their names) are coalesced into the
+    first one, their strengths combined with policy ("first" keeps the first strengths,
+    "sum" adds them, "max" keeps the largest in absolute value). Entries with both
+    strengths equal to 0, before or after combination, are removed. Files not found
+    are kept (path None) so that they can be reported.
+    """
+    entries = OrderedDict() # file (or name when not found) -> [lora name, file path, strength_model, strength_clip]
+    for (lora_name, strength_model, strength_clip) in (lora_stack or []):
+        if strength_model == 0 and strength_clip == 0:
+            logger.info(f"- SKIP [{lora_name}] - strength=0")
+            continue
+        (name, path) = resolved.get(lora_name, (lora_name, None))
+        key = os.path.normcase(os.path.abspath(path)) if path is not None else normalize_lora_name(lora_name).lower()
+        entry = entries.get(key, None)
+        if entry is None:
+            entries[key] = [name, path, strength_model, strength_clip]
+            continue
+        entry[2] = combine_strengths(entry[2], strength_model, policy)
+        entry[3] = combine_strengths(entry[3], strength_clip, policy)
+        logger.info(f"- [{lora_name}] same file as [{entry[0]}], strengths combined ({policy}) : {entry[2]} {entry[3]}")
+
+    stack = []
+    for (name, path, strength_model, strength_clip) in entries.values():
+        if strength_model == 0 and strength_clip == 0:
+            logger.info(f"- SKIP [{name}] - combined strength=0")
+            continue
+        stack.append((name, path, strength_model, strength_clip))
+    return stack
+
 # ===== NODES ==============================================================================================================================
 
 class LoraStack(io.ComfyNode):
@@ -106,31 +255,8 @@ class LoraStack(io.ComfyNode):
 
     @classmethod
     def execute(cls, loras_data, lora_stack=None):
-        try:
-            data = json.loads(loras_data)
-            if isinstance(data, list):
-                # backward-compat: old format was a bare array
-                loras, common_strength = data, False
-            elif isinstance(data, dict):
-                loras = data.get("loras", [])
-                common_strength = bool(data.get("commonStrength", False))
-            else:
-                loras, common_strength = [], False
-        except (json.JSONDecodeError, TypeError):
-            loras, common_strength = [], False
-
         stack = [] if lora_stack is None else clone_data(lora_stack)
-        for entry in loras:
-            if not isinstance(entry, dict):
-                continue
-            if not entry.get("enabled", True):
-                continue
-            name = entry.get("name", "")
-            if not name or name == "none":
-                continue
-            model_str = float(entry.get("modelStrength", 1.0))
-            clip_str  = model_str if common_strength else float(entry.get("clipStrength", 1.0))
-            stack.append((name, model_str, clip_str))
+        stack.extend(parse_loras_data(loras_data))
 
         return io.NodeOutput(stack)
 
@@ -172,12 +298,13 @@ class ApplyLoraStack(io.ComfyNode):
         return io.Schema(
             node_id=f"{ADDON_PREFIX}ApplyLoraStack",
             display_name=f"{ADDON_PREFIX} Apply Lora Stack",
-            description="Apply lora stack to model and (optionally) clip",
+            description="Apply lora stack to model and (optionally) clip. With fuse_loras, the plain low-rank LoRAs of the stack are merged into a single patch (cached by stack).",
             category=f"{ADDON_CATEGORY}/loras",
             inputs=[
                 LORA_STACK_TYPE.Input("lora_stack"),
                 io.Model.Input("model"),
                 io.Clip.Input("clip", optional=True),
+                io.Boolean.Input("fuse_loras", default=False, optional=True),
             ],
             outputs=[
                 LORA_STACK_TYPE.Output("lora_stack"),
@@ -187,13 +314,7 @@ class ApplyLoraStack(io.ComfyNode):
         )
 
     @classmethod
-    def execute(cls, lora_stack, model, clip=None):
-
-        global CACHED_LORAS
-        global MAX_CACHED_LORAS
-        global DOWNLOAD_MISSING_LORAS
-        global CLOUD_STORAGE_ID
-        global MODELS_DIR
+    def execute(cls, lora_stack, model, clip=None, fuse_loras=False):
 
         if lora_stack is None:
             return io.NodeOutput(lora_stack, model, clip)
@@ -203,89 +324,292 @@ class ApplyLoraStack(io.ComfyNode):
 
         logger.info("ApplyLoraStack :")
         applied_lora_stack = []
-        for (lora_name, strength_model, strength_clip) in lora_stack:
-            if strength_model == 0 and strength_clip == 0:
-                logger.info(f"- SKIP [{lora_name}] - strength=0")
-                continue
-
-            duplicated = False
-            for (applied_lora_name, _, _) in applied_lora_stack:
-                if lora_name == applied_lora_name:
-                    duplicated = True
-                    break
-            if duplicated:
-                logger.info(f"- SKIP [{lora_name}] - already applied")
-                continue
-
-            (lora_name, lora_path) = find_model_file("loras", lora_name)
-            if lora_path is None:
-                # lora file not present, try to get it from cloud or raise an error
-                if (CLOUD_STORAGE_ID == "") or (DOWNLOAD_MISSING_LORAS == False):  
-                    # download from cloud is not required or not possible: just notify the error
-                    msg = f"[{lora_name}] model file not found"
-                    notify_user("warn", "ApplyLoraStack", msg)           
-                    logger.warning("- ERROR " + msg)
+        # lora key names accepted by the model/clip, built on first use
+        key_map = None
+        # loras to be merged into a single patch (fuse_loras) : (name, path, state dict, strength_model, strength_clip)
+        to_fuse = []
+        fuse_key_maps = None
+        # position in the tree of already patched models: it moves one level down for each applied lora
+        patched_node = PATCHED_MODELS_CACHE.root(model, clip) if PATCHED_MODELS_CACHE.enabled else None
+        # find all the files first, so that the missing ones are downloaded in parallel,
+        # then apply the canonical stack (one entry per file)
+        timings = {}
+        resolved = resolve_lora_files([lora_name for (lora_name, strength_model, strength_clip) in lora_stack
+                                       if not (strength_model == 0 and strength_clip == 0)], timings)
+        timings = {resolved[lora_name][0]: values for (lora_name, values) in timings.items()}
+        stack = normalize_lora_stack(lora_stack, resolved, LORA_DUPLICATES)
+        # measurements of this run, one record per loaded entry (see LoraTelemetry)
+        prompt_id = current_prompt_id()
+        records = []
+        # the files used by this stack cannot be evicted from the cache until the whole stack is applied
+        with LORA_CACHE.protect() as protect_path:
+            # loras of a fused lora merged by a previous run: not loaded at all (see prefused_loras)
+            prefused = set()
+            if fuse_loras:
+                fuse_key_maps = build_key_maps(model, clip)
+                prefused = cls.prefused_loras(stack, model, clip, fuse_key_maps, protect_path)
+
+            for (lora_name, lora_path, strength_model, strength_clip) in stack:
+                record = LORA_TELEMETRY.new_record(lora_name, prompt_id, path=lora_path, **timings.get(lora_name, {}))
+                records.append(record)
+                if lora_path is None:
+                    record["status"] = "not found"
+                    continue
+                if lora_path in prefused:
+                    # applied with the fused lora after the loop
+                    to_fuse.append((lora_name, lora_path, None, strength_model, strength_clip))
+                    record.update(status="fused", source="fused lora", hit=True)
+                    logger.info(f"- OK [{lora_name}] - in a fused lora")
                     continue
-                else:
-                    # try to download from cloud
-                    logger.warning(f"- [{lora_name}] model file not found, attempting to download from {CLOUD_STORAGE_ID} ...")
-                    lora_name = normalize_lora_name(lora_name)
-                    save_path = MODELS_DIR / "loras" / Path(lora_name)
-                    (dl_result, dl_message) = download_file_from_cloud(
-                            cloud_storage_id=CLOUD_STORAGE_ID, 
-                            model_subpath="loras" / Path(lora_name), 
-                            save_path=save_path
-                        )
-                    if dl_result:
-                        # success: proceed with next steps
-                        logger.info(f"- {dl_message}")
-                        lora_path = str(save_path)
-                    else:
-                        # failure: stop
-                        notify_user("warn", "ApplyLoraStack", f"[{lora_name}] model file not found and unable to download from cloud")
-                        logger.warning(f"- ERROR [{lora_name}] {dl_message}")
-                        continue
 
-            try:
-                lora = None
-                for(cached_lora_path, cached_lora) in CACHED_LORAS:
-                    if cached_lora_path == lora_path:
-                        lora = cached_lora
-                        break
+                try:
+                    # also keeps the patched models built with this file in the tree (see PatchedModelCache.forget)
+                    protect_path(lora_path)
+                    patch_key = (lora_path, strength_model, strength_clip)
+                    patched = None if patched_node is None else PATCHED_MODELS_CACHE.child(patched_node, patch_key)
+                    if patched is not None:
+                        # same base model and same loras so far: continue from the model patched by a previous run
+                        patched_node = patched
+                        model, clip = patched.model, patched.clip
+                        msg = "patched model reused"
+                        record.update(status="reused", source=msg, hit=True)
+                    else:
+                        # skip the loras trained for another architecture before reading their tensors
+                        if CHECK_LORA_COMPATIBILITY:
+                            if key_map is None:
+                                key_map = build_lora_key_map(model, clip)
+                            if not is_lora_compatible(lora_path, key_map):
+                                msg = f"[{lora_name}] not compatible with the model, skipped"
+                                notify_user("warn", "ApplyLoraStack", msg)
+                                logger.warning("- SKIP " + msg)
+                                record["status"] = "incompatible"
+                                continue
+
+                        start = time.perf_counter()
+                        (lora, msg) = LORA_CACHE.load(lora_path)
+                        hit = msg in ["retrieved from cache", "loaded by a concurrent request"]
+                        record.update(load_s=time.perf_counter() - start, source=msg, hit=hit, bytes=0 if hit else state_dict_bytes(lora))
+
+                        if fuse_loras:
+                            parts = split_low_rank(lora, fuse_key_maps[0])
+                            if parts is not None:
+                                # patched once for the whole stack, after the loop
+                                to_fuse.append((lora_name, lora_path, parts, strength_model, strength_clip))
+                                record["status"] = "to be fused"
+                                logger.info(f"- OK [{lora_name}] - {msg}, to be fused")
+                                continue
+                            logger.info(f"- [{lora_name}] cannot be fused, applied on its own")
+
+                        start = time.perf_counter()
+                        model, clip = load_lora_for_models(model, clip, lora, strength_model, strength_clip)
+                        record["patch_s"] = time.perf_counter() - start
+                        record["status"] = "applied"
+                        if patched_node is not None:
+                            patched_node = PATCHED_MODELS_CACHE.add(patched_node, patch_key, model, clip)
+
+                    applied_lora_stack.append([lora_name, strength_model, strength_clip])
+
+                    logger.info(f"- OK [{lora_name}] - {msg}")
+                except Exception as e:
+                    record["status"] = "error"
+                    logger.info(f"- ERROR [{lora_name}] - {e}")
+
+            if len(to_fuse) > 0:
+                start = time.perf_counter()
+                (model, clip) = cls.apply_fused(to_fuse, fuse_key_maps, model, clip, patched_node, applied_lora_stack)
+                records.append(LORA_TELEMETRY.new_record(f"fused ({len(to_fuse)} loras)", prompt_id, status="fused",
+                                                         patch_s=time.perf_counter() - start))
+
+        LORA_TELEMETRY.add(records)
 
-                if lora is None:
-                    lora = comfy.utils.load_torch_file(lora_path, safe_load=True)
-                    CACHED_LORAS.append([lora_path, lora])
-                    msg = "loaded from disk (added to cache)"
-                else:
-                    msg = "retrieved from cache"
+        logger.info("Final stack :")
+        for (lora_name, strength_model, strength_clip) in applied_lora_stack:
+            logger.info(f"- {lora_name} {strength_model} {strength_clip}")
 
-                model, clip = comfy.sd.load_lora_for_models(model, clip, lora, strength_model, strength_clip)
+        LORA_CACHE.log_content()
 
-                applied_lora_stack.append([lora_name, strength_model, strength_clip])
+        return io.NodeOutput(applied_lora_stack, model, clip)
 
-                logger.info(f"- OK [{lora_name}] - {msg}")
-            except Exception as e:
-                logger.info(f"- ERROR [{lora_name}] - {e}")
+    @classmethod
+    def prefused_loras(cls, stack, model, clip, key_maps, protect_path) -> set:
+        # paths of the loras of the stack whose fused lora is already merged (lora cache or fused_dir):
+        # the fusable loras are told from their header, as split_low_rank would after loading them,
+        # so the fingerprint is the one apply_fused records for the same stack
+        entries = [(lora_path, strength_model, strength_clip) for (_, lora_path, strength_model, strength_clip) in stack
+                   if lora_path is not None and is_fusable(lora_path, key_maps[0])]
+        if len(entries) == 0:
+            return set()
+        try:
+            fingerprint = stack_fingerprint(model, clip, entries)
+        except OSError:
+            return set()
+        cache_key = f"fused:{fingerprint}"
+        if not (cache_key in LORA_CACHE or fused_on_disk(fingerprint)):
+            return set()
+        protect_path(cache_key)
+        return set(lora_path for (lora_path, _, _) in entries)
 
-        logger.info("Final stack :")
-        for (lora_name, strength_model, strength_clip) in applied_lora_stack:
-            logger.info(f"- {lora_name} {strength_model} {strength_clip}")
+    @classmethod
+    def fused_from_cache(cls, entries, model, clip, patched_node):
+        # apply the fused lora of entries = [(name, path, strength_model, strength_clip), ...] when it was
+        # already merged (patched model, lora cache or disk); return (model, clip, message), None if not available
+        try:
+            fingerprint = stack_fingerprint(model, clip, [(path, sm, sc) for (_, path, sm, sc) in entries])
+        except OSError:
+            return None
+        cache_key = f"fused:{fingerprint}"
+        patch_key = (cache_key, 1.0, 1.0)
+        patched = None if patched_node is None else PATCHED_MODELS_CACHE.child(patched_node, patch_key)
+        if patched is not None:
+            return (patched.model, patched.clip, f"[{fingerprint[:12]}] patched model reused")
+        fused = LORA_CACHE.get(cache_key)
+        msg = "retrieved from cache"
+        if fused is None:
+            fused = load_fused_from_disk(fingerprint)
+            if fused is None:
+                return None
+            msg = "loaded from disk"
+            fused = LORA_CACHE.put(cache_key, fused, mapped=True).lora
+        model, clip = load_lora_for_models(model, clip, fused, 1.0, 1.0)
+        if patched_node is not None:
+            PATCHED_MODELS_CACHE.add(patched_node, patch_key, model, clip)
+        return (model, clip, f"[{fingerprint[:12]}] {msg}")
 
-        logger.info("Current cache :")
-        for (cached_lora_path, _) in CACHED_LORAS:
-            logger.info(f"- {cached_lora_path}")
+    @classmethod
+    def apply_fused(cls, to_fuse, key_maps, model, clip, patched_node, applied_lora_stack):
+        # merge the low-rank loras of the stack into one and apply it with a single patch;
+        # the fused lora is kept in the lora cache (and optionally on disk) under the stack fingerprint.
+        # to_fuse = [(name, path, parts (None when not loaded, see prefused_loras), strength_model, strength_clip), ...]
+        try:
+            fused = cls.fused_from_cache([(name, path, sm, sc) for (name, path, _, sm, sc) in to_fuse], model, clip, patched_node)
+            if fused is not None:
+                (model, clip, msg) = fused
+            else:
+                # the fused lora is gone meanwhile: load the loras that were skipped
+                to_fuse = [(name, path, parts if parts is not None else split_low_rank(LORA_CACHE.load(path)[0], key_maps[0]), sm, sc)
+                           for (name, path, parts, sm, sc) in to_fuse]
+                if any(parts is None for (_, _, parts, _, _) in to_fuse):
+                    raise ValueError("a lora cannot be fused")
+                fingerprint = stack_fingerprint(model, clip, [(path, sm, sc) for (_, path, _, sm, sc) in to_fuse])
+                fused = fuse_low_rank([(parts, sm, sc) for (_, _, parts, sm, sc) in to_fuse], key_maps[0], key_maps[1])
+                if fused is None:
+                    raise ValueError("the loras cannot be merged")
+                save_fused_to_disk(fingerprint, fused)
+                cache_key = f"fused:{fingerprint}"
+                fused = LORA_CACHE.put(cache_key, fused).lora
+                model, clip = load_lora_for_models(model, clip, fused, 1.0, 1.0)
+                if patched_node is not None:
+                    PATCHED_MODELS_CACHE.add(patched_node, (cache_key, 1.0, 1.0), model, clip)
+                msg = f"[{fingerprint[:12]}] merged"
+            for (lora_name, _, _, strength_model, strength_clip) in to_fuse:
+                applied_lora_stack.append([lora_name, strength_model, strength_clip])
+            logger.info(f"- OK {len(to_fuse)} loras fused - {msg}")
+            return (model, clip)
+        except Exception as e:
+            # fall back to one patch per lora
+            logger.info(f"- fusion failed ({e}), applying the loras one by one")
+            for (lora_name, lora_path, _, strength_model, strength_clip) in to_fuse:
+                try:
+                    (lora, _) = LORA_CACHE.load(lora_path)
+                    model, clip = load_lora_for_models(model, clip, lora, strength_model, strength_clip)
+                    applied_lora_stack.append([lora_name, strength_model, strength_clip])
+                    logger.info(f"- OK [{lora_name}]")
+                except Exception as e:
+                    logger.info(f"- ERROR [{lora_name}] - {e}")
+            return (model, clip)
+
+class ApplyLoraStackSweep(io.ComfyNode):
+    @classmethod
+    def define_schema(cls):
+        return io.Schema(
+            node_id=f"{ADDON_PREFIX}ApplyLoraStackSweep",
+            display_name=f"{ADDON_PREFIX} Apply Lora Stack Sweep",
+            description="""
+    Apply a lora stack once per strength multiplier, and output the list of patched models (e.g. for XY grids).
+    Every lora file is loaded once for the whole sweep.
+    sweep = "last lora" : only the strengths of the last lora of the stack are multiplied,
+    the other loras are applied once and shared by all the outputs.
+    sweep = "all loras" : the strengths of every lora are multiplied.
+    """,
+            category=f"{ADDON_CATEGORY}/loras",
+            inputs=[
+                LORA_STACK_TYPE.Input("lora_stack"),
+                io.Model.Input("model"),
+                io.Clip.Input("clip", optional=True),
+                io.String.Input("multipliers", default="0.0, 0.25, 0.5, 0.75, 1.0"),
+                io.Combo.Input("sweep", options=["last lora", "all loras"], default="last lora"),
+            ],
+            outputs=[
+                io.Model.Output("model", is_output_list=True),
+                io.Clip.Output("clip", is_output_list=True),
+                io.String.Output("label", is_output_list=True),
+            ],
+        )
 
-        if len(CACHED_LORAS) > MAX_CACHED_LORAS:
-            logger.info(f"Pruning cache (max={MAX_CACHED_LORAS}):")
-            while len(CACHED_LORAS) > MAX_CACHED_LORAS:
-                (cached_lora_path, cached_lora) = CACHED_LORAS.pop(0)
-                logger.info(f"- remove {cached_lora_path}")
-            logger.info("Final cache :")
-            for (cached_lora_path, _) in CACHED_LORAS:
-                logger.info(f"- {cached_lora_path}")
+    @classmethod
+    def execute(cls, lora_stack, model, clip=None, multipliers="", sweep="last lora"):
 
-        return io.NodeOutput(applied_lora_stack, model, clip)
+        values = []
+        for text in re.split(r"[,;\s]+", multipliers):
+            if text == "":
+                continue
+            try:
+                values.append(float(text))
+            except ValueError:
+                logger.warning(f"ApplyLoraStackSweep : invalid multiplier [{text}] ignored")
+        if len(values) == 0:
+            values = [1.0]
+
+        logger.info(f"ApplyLoraStackSweep : {len(values)} multipliers, sweep {sweep}")
+        models, clips, labels = [], [], []
+        with LORA_CACHE.protect() as protect_path:
+            # resolve and load every lora once
+            resolved = resolve_lora_files([name for (name, sm, sc) in (lora_stack or []) if not (sm == 0 and sc == 0)])
+            entries = [] # (name, state dict, strength_model, strength_clip)
+            key_map = None
+            for (lora_name, lora_path, strength_model, strength_clip) in normalize_lora_stack(lora_stack, resolved, LORA_DUPLICATES):
+                if lora_path is None:
+                    continue
+                try:
+                    # skip the loras trained for another architecture before reading their tensors (as ApplyLoraStack)
+                    if CHECK_LORA_COMPATIBILITY:
+                        if key_map is None:
+                            key_map = build_lora_key_map(model, clip)
+                        if not is_lora_compatible(lora_path, key_map):
+                            msg = f"[{lora_name}] not compatible with the model, skipped"
+                            notify_user("warn", "ApplyLoraStackSweep", msg)
+                            logger.warning("- SKIP " + msg)
+                            continue
+                    protect_path(lora_path)
+                    (lora, msg) = LORA_CACHE.load(lora_path)
+                    entries.append((lora_name, lora, strength_model, strength_clip))
+                    logger.info(f"- [{lora_name}] - {msg}")
+                except Exception as e:
+                    logger.info(f"- ERROR [{lora_name}] - {e}")
+
+            fixed = entries[:-1] if sweep == "last lora" else []
+            swept = entries[-1:] if sweep == "last lora" else entries
+
+            # the loras that do not change are applied once for all the outputs
+            for (lora_name, lora, strength_model, strength_clip) in fixed:
+                try:
+                    model, clip = load_lora_for_models(model, clip, lora, strength_model, strength_clip)
+                except Exception as e:
+                    logger.info(f"- ERROR [{lora_name}] - {e}")
+
+            for multiplier in values:
+                swept_model, swept_clip = model, clip
+                for (lora_name, lora, strength_model, strength_clip) in swept:
+                    try:
+                        swept_model, swept_clip = load_lora_for_models(swept_model, swept_clip, lora, strength_model * multiplier, strength_clip * multiplier)
+                    except Exception as e:
+                        logger.info(f"- ERROR [{lora_name}] x{multiplier:g} - {e}")
+                models.append(swept_model)
+                clips.append(swept_clip)
+                labels.append(f"x{multiplier:g}")
+
+        logger.info(f"- {len(models)} models patched ({len(fixed)} fixed + {len(swept)} swept loras)")
+        return io.NodeOutput(models, clips, labels)
 
 class ConvertLoraStackToString(io.ComfyNode):
     @classmethod
@@ -343,7 +667,11 @@ class ConvertLoraStringToStack(io.ComfyNode):
         if initial_lora_stack is None:
             initial_lora_stack = []
 
-        final_lora_stack = initial_lora_stack + extract_lora_strings(prompt)
+        prompt_lora_stack = extract_lora_strings(prompt)
+        # start loading the loras now: they will be needed by ApplyLoraStack later in the workflow
+        prefetch_loras(prompt_lora_stack)
+
+        final_lora_stack = initial_lora_stack + prompt_lora_stack
 
         clean_prompt = remove_text_between_angle_brackets(prompt)
 
@@ -356,6 +684,7 @@ def get_nodes_list() -> list[type[io.ComfyNode]]:
         LoraStack,
         MergeLoraStacks,
         ApplyLoraStack,
+        ApplyLoraStackSweep,
         ConvertLoraStackToString,
         ConvertLoraStringToStack,
     ]
@@ -368,12 +697,106 @@ from server import PromptServer
 
 # Support routes for lora loader
 
+def load_loras_list_source():
+    # names of the loras, and the entry of folder_paths.filename_list_cache they come from
+    # (None if it was replaced meanwhile, by a rescan or the model folders watcher)
+    source = folder_paths.filename_list_cache.get("loras", None)
+    names = load_list_loras()
+    return (names, source if folder_paths.filename_list_cache.get("loras", None) is source else None)
+
+def loras_list_response(request, names:list, source=None):
+    # Answer of the list endpoints, versioned with an ETag (the version of the list):
+    # - If-None-Match with the current version : 304, nothing is sent again
+    # - ?since=<version> : {"version", "added": [...], "removed": [...]}, or {"version", "names": [...]}
+    #   when that version is too old or unknown (e.g. after a restart)
+    # - otherwise : the list of names
+    version = LORA_LIST_VERSIONS.update(names, source)
+    headers = {"ETag": f'"{version}"'}
+    if request.headers.get("If-None-Match", "").strip('"') == version:
+        return web.Response(status=304, headers=headers)
+    since = request.query.get("since", None)
+    if since is None:
+        return web.json_response(names, headers=headers)
+    delta = LORA_LIST_VERSIONS.delta(since)
+    if delta is None:
+        return web.json_response({"version": version, "names": names}, headers=headers)
+    (added, removed) = delta
+    return web.json_response({"version": version, "added": added, "removed": removed}, headers=headers)
+
 @PromptServer.instance.routes.get(f"/{API_PREFIX}/get_loras_list")
 async def get_loras_list(request):
-    return web.json_response(load_list_loras())
+    # ?info=1 : return the names with the header-only data of the files
+    # (tensors, dtype, bytes, rank, base_model, resolution, file_bytes), as {"names": [...], "info": {name: {...}}}
+    (names, source) = load_loras_list_source()
+    if request.query.get("info", "") in ["", "0", "false"]:
+        return loras_list_response(request, names, source)
+    info = await asyncio.get_running_loop().run_in_executor(None, LORA_INDEX.get_loras_info, names)
+    return web.json_response({"names": names, "info": info})
 
 @PromptServer.instance.routes.post(f"/{API_PREFIX}/reload_loras_list")
 async def reload_loras_list(request):
-    # drop folder_paths' cached scan so the list is rebuilt from disk
-    folder_paths.filename_list_cache.pop("loras", None)
-    return web.json_response(load_list_loras())
+    # folder_paths revalidates its cached scan with the mtimes of the scanned folders, so only
+    # a change on disk triggers a rescan; ?full=1 drops the cached scan and always rescans
+    if request.query.get("full", "") in ["1", "true"]:
+        folder_paths.filename_list_cache.pop("loras", None)
+        MODEL_INDEX.invalidate("loras")
+    (names, source) = await asyncio.get_running_loop().run_in_executor(None, load_loras_list_source)
+    return loras_list_response(request, names, source)
+
+# Measurements of ApplyLoraStack
+
+@PromptServer.instance.routes.get(f"/{API_PREFIX}/lora_telemetry")
+async def lora_telemetry(request):
+    # ?prompt_id=... : only the records of a prompt; ?limit=N : only the last N records
+    # return {"records": [...], "prompts": {prompt_id: summary}}
+    prompt_id = request.query.get("prompt_id", None)
+    try:
+        limit = int(request.query["limit"]) if "limit" in request.query else None
+    except ValueError:
+        return web.json_response({"error": "limit must be an integer"}, status=400)
+    return web.json_response(LORA_TELEMETRY.describe(prompt_id, limit))
+
+# Inspect, warm and evict the LoRA cache of ApplyLoraStack
+
+@PromptServer.instance.routes.get(f"/{API_PREFIX}/lora_cache")
+async def lora_cache_list(request):
+    # cache totals and entries (path, bytes, hits, last_used as epoch seconds ...)
+    return web.json_response(LORA_CACHE.describe())
+
+@PromptServer.instance.routes.post(f"/{API_PREFIX}/lora_cache/preload")
+async def lora_cache_preload(request):
+    # Payload: { loras: ["name", ...] } (names as in a lora stack); the files are loaded in background
+    try:
+        data = await request.json()
+    except Exception:
+        data = {}
+    if not isinstance(data, dict) or not isinstance(data.get("loras", []), list):
+        return web.json_response({"message": "expected { loras: [...] }"}, status=400)
+    names = [str(name) for name in data.get("loras", []) if name]
+    prefetch_loras([(name, 1.0, 1.0) for name in names], force=True)
+    return web.json_response({"queued": names})
+
+@PromptServer.instance.routes.post(f"/{API_PREFIX}/lora_cache/evict")
+async def lora_cache_evict(request):
+    # Payload: { loras: ["name or path", ...] } or { all: true }
+    # LoRAs used by a running ApplyLoraStack are never evicted
+    try:
+        data = await request.json()
+    except Exception:
+        data = {}
+    if not isinstance(data, dict) or not isinstance(data.get("loras", []), list):
+        return web.json_response({"message": "expected { loras: [...] } or { all: true }"}, status=400)
+    if data.get("all", False):
+        evicted = LORA_CACHE.clear()
+        logger.info(f"LoraCache : {evicted} entries evicted on request")
+        return web.json_response({"evicted": evicted})
+
+    evicted = []
+    for name in data.get("loras", []):
+        # only the file at the exact position given: a lookup in the other subfolders could find another lora
+        name = str(name)
+        path = name if name in LORA_CACHE else folder_paths.get_full_path("loras", name)
+        if path is not None and LORA_CACHE.evict(path):
+            evicted.append(path)
+            logger.info(f"LoraCache : {path} evicted on request")
+    return web.json_response({"evicted": len(evicted), "paths": evicted})
@@ -8,7 +8,7 @@ from pathlib import Path
 
 from ..config_variables import ADDON_PREFIX, ADDON_CATEGORY, API_PREFIX, SETTINGS_DIR
 from .logging import logger
-from .utils import load_list_models, load_list_samplers, load_list_schedulers, find_model_file
+from .utils import load_list_models, load_list_samplers, load_list_schedulers, find_model_file, resolve_models
 from ..scripts.ntxdata_file import NtxDataFile
 
 MODELTYPE_SEPARATOR = ":"
@@ -180,21 +180,22 @@ async def get_modelinfo_data(request):
 
     # validate the values
 
+    def _is_clip(name:str):
+        return not name.strip().lower() in ["", "none", "embedded"]
+
+    def _is_vae(name:str):
+        return not name.strip().lower() in ["", "baked vae", "embedded"]
+
+    # the clips and the vae are resolved together, in a single pass (see resolve_models)
+    models = [("clip", name) for name in [source_data.get(key, "") for key in ["clip", "clip2", "clip3"]] if _is_clip(name)]
+    models += [("vae", name) for name in [source_data.get("vae", "")] if _is_vae(name)]
+    found = dict(zip(models, resolve_models(models)))
+
     def _check_clip(name:str):
-        name_clean = name.strip().lower()
-        if name_clean == "" or name_clean in ["none", "embedded"]:
-            return "None"
-        else:
-            (model_name_found, model_path) = find_model_file("clip", name)
-            return model_name_found
+        return found[("clip", name)][0] if _is_clip(name) else "None"
 
     def _check_vae(name:str):
-        name_clean = name.strip().lower()
-        if name_clean == "" or name_clean in ["baked vae", "embedded"]:
-            return "Baked VAE"
-        else:
-            (model_name_found, model_path) = find_model_file("vae", name)
-            return model_name_found
+        return found[("vae", name)][0] if _is_vae(name) else "Baked VAE"
 
     response = {}
     response["model_name"] =            model_name
@@ -262,6 +263,41 @@ async def save_modelinfo_data(request):
 
     return web.json_response({"message": f"Saved to {new_data_file_path}"})
 
+@PromptServer.instance.routes.post(f"/{API_PREFIX}/resolve_models")
+async def resolve_models_route(request):
+    # Resolves a set of models in one request (for example every model widget of a workflow).
+    # Payload: { models: [[model_type, model_name], ...], look_in_all_dirs? }
+    # Response: { models: [{model_type, model_name, name, path, tier, suggestion}, ...] } in the same order,
+    # name is the canonical name (relative to the model folder), path and tier are null if not found,
+    # suggestion is then the most similar model name ({name, similarity}, null if none)
+    try:
+        data = await request.json()
+    except ValueError:
+        return web.json_response({"message": "invalid JSON"}, status=400)
+    if not isinstance(data, dict) or not isinstance(data.get("models", None) or [], list):
+        return web.json_response({"message": "expected { models: [[model_type, model_name], ...] }"}, status=400)
+    models = []
+    for entry in data.get("models", None) or []:
+        if isinstance(entry, dict):
+            entry = (entry.get("model_type", ""), entry.get("model_name", ""))
+        if not isinstance(entry, (list, tuple)) or len(entry) != 2:
+            return web.json_response({"message": f"invalid entry {entry}: expected [model_type, model_name]"}, status=400)
+        models.append((str(entry[0]), str(entry[1])))
+
+    suggestions = {}
+    resolved = resolve_models(models, bool(data.get("look_in_all_dirs", True)), suggestions)
+    return web.json_response({"models": [
+        {
+            "model_type": model_type,
+            "model_name": model_name,
+            "name": name.replace("\\", "/"),
+            "path": path,
+            "tier": tier,
+            "suggestion": {"name": suggestion[0].replace("\\", "/"), "similarity": round(suggestion[1], 3)}
+                          if (suggestion := suggestions.get((model_type, model_name), None)) is not None else None,
+        } for ((model_type, model_name), (name, path, tier)) in zip(models, resolved)
+    ]})
+
 # ----- "Edit model info" (web/js/model.edit_model_info.js) -------------------------------------------------------------------------------
 
 # Model branches shown in the frontend tree, in display order.
@@ -0,0 +1,308 @@
+import folder_paths
+
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from ..config_variables import MODEL_INDEX_CONFIG
+from .logging import logger
+from .model_index_db import MODEL_INDEX_DB
+
+# ===== MODEL FILES INDEX ==================================================================================================================
+
+# a lookup that finds nothing rescans the folders of its model type, at most once in this delay (seconds)
+INDEX_RESCAN_DELAY = 60
+# minimum similarity (0 to 1) of a suggestion for a model not found (see ModelIndex.suggest_many), 0 disables them
+FUZZY_THRESHOLD = float(MODEL_INDEX_CONFIG.get("fuzzy_threshold", 0.8) or 0)
+
+def fold_path(path:str) -> str:
+    # key of the case-insensitive tiers: "/" separators, case folded
+    return path.replace("\\", "/").casefold()
+
+def trigrams(text:str) -> set:
+    # trigrams of the words of a name (lower case letters and digits, other characters are separators)
+    text = re.sub(r"[^0-9a-z]+", " ", text.casefold()).strip()
+    if text == "":
+        return set()
+    text = f"  {text} "
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+class ModelTypeIndex():
+    """Files of the folders of a model type, entries (relative name, full path, folder rank) indexed by:
+    - path        : case-folded relative path
+    - name / stem : case-folded bare file name, and file name without extension
+    - trigrams    : trigram of the stem -> full paths, for the suggestions
+    Tables are never modified in place: scan, add and remove build new ones (copy-on-write) and
+    swap them in, so lookups, which read each table once, do not need to lock. Changes are made
+    under the lock of ModelIndex, one at a time.
+    """
+    TABLES = ["path", "name", "stem"]
+
+    def __init__(self, model_type:str):
+        self.model_type = model_type
+        self.tables = {table: {} for table in self.TABLES}
+        self.entries = {}     # full path -> entry
+        self.trigrams = {}    # trigram -> frozenset of full paths
+        self.gram_counts = {} # full path -> number of trigrams of its stem
+        self.built = 0.0
+
+    @property
+    def files(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def _keys(entry) -> list:
+        (relative_name, full_path, _) = entry
+        file_name = os.path.basename(full_path)
+        stem = os.path.splitext(file_name)[0]
+        return [("path", fold_path(relative_name)), ("name", file_name.casefold()), ("stem", stem.casefold())]
+
+    def scan(self):
+        # through the persistent database when enabled (only the changed folders are listed), else a walk of the folders
+        (model_dirs, extensions) = folder_paths.folder_names_and_paths.get(self.model_type, ([], set()))
+        files = [] # (relative name, full path, folder rank)
+        if MODEL_INDEX_DB is not None:
+            (db_files, _) = MODEL_INDEX_DB.scan(self.model_type)
+            files = [(relative_name, full_path, rank) for (_, rank, relative_name, full_path, _, _) in db_files]
+        else:
+            for (rank, model_dir) in enumerate(model_dirs):
+                if not os.path.isdir(model_dir):
+                    continue
+                for (dir_path, dir_names, file_names) in os.walk(model_dir, followlinks=True):
+                    for file_name in file_names:
+                        full_path = os.path.join(dir_path, file_name)
+                        files.append((os.path.relpath(full_path, model_dir), full_path, rank))
+
+        tables = {table: {} for table in self.TABLES}
+        entries = {}
+        grams = {}
+        gram_counts = {}
+        for entry in sorted(files, key=lambda entry: (entry[2], entry[0])):
+            full_path = entry[1]
+            if len(extensions) > 0 and not os.path.splitext(full_path)[1].lower() in extensions:
+                continue
+            entries[full_path] = entry
+            for (table, key) in self._keys(entry):
+                tables[table].setdefault(key, []).append(entry)
+            entry_grams = trigrams(os.path.splitext(os.path.basename(full_path))[0])
+            gram_counts[full_path] = len(entry_grams)
+            for gram in entry_grams:
+                grams.setdefault(gram, set()).add(full_path)
+        (self.tables, self.entries, self.gram_counts) = (tables, entries, gram_counts)
+        self.trigrams = {gram: frozenset(paths) for (gram, paths) in grams.items()}
+        self.built = time.time()
+
+    def add(self, model_dir:str, full_path:str):
+        # a file appeared in model_dir
+        (model_dirs, extensions) = folder_paths.folder_names_and_paths.get(self.model_type, ([], set()))
+        if len(extensions) > 0 and not os.path.splitext(full_path)[1].lower() in extensions:
+            return
+        rank = model_dirs.index(model_dir) if model_dir in model_dirs else len(model_dirs)
+        entry = (os.path.relpath(full_path, model_dir), full_path, rank)
+        (tables, entries, grams, gram_counts) = self._copy()
+        self._remove_paths(tables, entries, grams, gram_counts, [full_path])
+        entries[full_path] = entry
+        for (table, key) in self._keys(entry):
+            tables[table][key] = tables[table].get(key, []) + [entry]
+        entry_grams = trigrams(os.path.splitext(os.path.basename(full_path))[0])
+        gram_counts[full_path] = len(entry_grams)
+        for gram in entry_grams:
+            grams[gram] = grams.get(gram, frozenset()) | {full_path}
+        (self.tables, self.entries, self.trigrams, self.gram_counts) = (tables, entries, grams, gram_counts)
+
+    def remove(self, full_path:str, is_dir:bool=False):
+        # a file disappeared (or a folder, with every file below it)
+        prefix = os.path.join(full_path, "")
+        paths = [path for path in self.entries.keys() if path.startswith(prefix)] if is_dir else [full_path]
+        if not any(path in self.entries for path in paths):
+            return
+        (tables, entries, grams, gram_counts) = self._copy()
+        self._remove_paths(tables, entries, grams, gram_counts, paths)
+        (self.tables, self.entries, self.trigrams, self.gram_counts) = (tables, entries, grams, gram_counts)
+
+    def _copy(self):
+        # copies of the tables, to be modified then swapped in (the lists and frozensets they hold are replaced, never modified)
+        return ({table: dict(keys) for (table, keys) in self.tables.items()}, dict(self.entries), dict(self.trigrams), dict(self.gram_counts))
+
+    def _remove_paths(self, tables:dict, entries:dict, grams:dict, gram_counts:dict, paths:list):
+        for path in paths:
+            entry = entries.pop(path, None)
+            if entry is None:
+                continue
+            for (table, key) in self._keys(entry):
+                kept = [other for other in tables[table].get(key, []) if other[1] != path]
+                if len(kept) > 0:
+                    tables[table][key] = kept
+                else:
+                    tables[table].pop(key, None)
+            gram_counts.pop(path, None)
+            for gram in trigrams(os.path.splitext(os.path.basename(path))[0]):
+                kept = grams.get(gram, frozenset()) - {path}
+                if len(kept) > 0:
+                    grams[gram] = kept
+                else:
+                    grams.pop(gram, None)
+
+    def candidates(self, model_name:str):
+        # (tier, files) of the first tier matching model_name: case-folded path (also without a leading
+        # folder named as the model type, e.g. "Loras/"), then bare name ignoring case (by stem if
+        # model_name has no extension); (None, []) if none matches
+        tables = self.tables
+        path = fold_path(model_name)
+        parts = path.split("/")
+        for key in [path, "/".join(parts[1:]) if len(parts) > 1 and parts[0] == self.model_type.casefold() else None]:
+            candidates = tables["path"].get(key, []) if key else []
+            if len(candidates) > 0:
+                return ("casefold", candidates)
+        bare_name = parts[-1]
+        has_extension = os.path.splitext(bare_name)[1] != ""
+        candidates = tables["name" if has_extension else "stem"].get(bare_name, [])
+        if len(candidates) > 0:
+            return ("name", candidates)
+        return (None, [])
+
+    def fuzzy(self, model_name:str, threshold:float):
+        # (similarity, files) of the files whose stem is the most similar to the one of model_name
+        # (Jaccard index of the trigrams, at least threshold), (0, []) if none
+        query = trigrams(os.path.splitext(os.path.basename(model_name.replace("\\", "/")))[0])
+        if len(query) == 0:
+            return (0.0, [])
+        # the tables read once: a change made meanwhile may mix two versions, hence the missing entries skipped
+        (grams, gram_counts, entries) = (self.trigrams, self.gram_counts, self.entries)
+        common = Counter()
+        for gram in query:
+            common.update(grams.get(gram, ()))
+        best = (0.0, [])
+        for (path, count) in common.items():
+            similarity = count / (len(query) + gram_counts.get(path, 0) - count)
+            if similarity < threshold or similarity < best[0]:
+                continue
+            entry = entries.get(path, None)
+            if entry is None:
+                continue
+            best = (similarity, best[1] + [entry]) if similarity == best[0] else (similarity, [entry])
+        return best
+
+def _choose(model_name:str, candidates:list):
+    """Deterministic choice among the files matching a name:
+    1. the one whose relative path ends with the most components of model_name (the subdirs given by the caller, ignoring case)
+    2. the one whose file name has the same case as in model_name
+    3. the least deep
+    4. the one of the first folder configured in ComfyUI
+    5. the first relative path in alphabetical order
+    """
+    wanted = fold_path(model_name).split("/")
+    wanted_name = os.path.basename(model_name.replace("\\", "/"))
+
+    def score(entry):
+        (relative_name, _, rank) = entry
+        parts = fold_path(relative_name).split("/")
+        if os.path.splitext(wanted[-1])[1] == "":
+            parts[-1] = os.path.splitext(parts[-1])[0] # name given without extension
+        common = 0
+        while common < min(len(parts), len(wanted)) and parts[-1 - common] == wanted[-1 - common]:
+            common += 1
+        file_name = os.path.basename(relative_name)
+        same_case = file_name == wanted_name or os.path.splitext(file_name)[0] == wanted_name
+        return (-common, not same_case, len(parts), rank, relative_name)
+
+    return min(candidates, key=score)
+
+class ModelIndex():
+    """Index of the model files, one per model type, used by find_model_file to find a model
+    when the name given does not match its actual position (see ModelTypeIndex).
+
+    Each model type is indexed with a single walk of its folders on first use; a lookup is
+    then a dictionary access instead of a stat in every subfolder. A lookup that finds a file
+    which no longer exists, or finds nothing, rescans the folders (a miss at most once every
+    INDEX_RESCAN_DELAY seconds, so repeated misses do not rescan every time).
+    """
+    def __init__(self):
+        self.types = {} # model_type -> ModelTypeIndex
+        self.lock = threading.Lock()
+
+    def _get(self, model_type:str, rescan:bool=False) -> ModelTypeIndex:
+        with self.lock:
+            index = self.types.get(model_type, None)
+            if index is None or rescan:
+                start = time.perf_counter()
+                index = ModelTypeIndex(model_type)
+                index.scan()
+                self.types[model_type] = index
+                logger.info(f"ModelIndex : {model_type} indexed, {index.files} files in {time.perf_counter() - start:.2f} s")
+            return index
+
+    def invalidate(self, model_type:str=None):
+        # forget the index of a model type (all types if None), rebuilt on next lookup
+        with self.lock:
+            if model_type is None:
+                self.types.clear()
+            else:
+                self.types.pop(model_type, None)
+
+    def file_added(self, model_type:str, model_dir:str, full_path:str):
+        # update an existing index with a new file of model_dir (the types not indexed yet are left alone)
+        with self.lock:
+            index = self.types.get(model_type, None)
+            if index is not None:
+                index.add(model_dir, full_path)
+
+    def file_removed(self, model_type:str, full_path:str, is_dir:bool=False):
+        # update an existing index with a removed file or folder
+        with self.lock:
+            index = self.types.get(model_type, None)
+            if index is not None:
+                index.remove(full_path, is_dir)
+
+    def lookup(self, model_type:str, model_name:str):
+        """(relative name, full path, tier) of the file for model_name, None if not found.
+        Tiers, by priority: "casefold" (same relative path, ignoring case and separators)
+        and "name" (same bare file name ignoring case, in any subfolder)."""
+        return self.lookup_many(model_type, [model_name])[model_name]
+
+    def lookup_many(self, model_type:str, model_names:list) -> dict:
+        # same as lookup for several names of a model type, {model_name: (relative name, full path, tier) or None}:
+        # the index is fetched once, and rescanned at most once for all the names
+        found = {}
+        pending = list(dict.fromkeys(model_names))
+        for attempt in range(2):
+            index = self._get(model_type, rescan=(attempt > 0))
+            retry = []
+            for model_name in pending:
+                (tier, candidates) = index.candidates(model_name)
+                if len(candidates) == 0:
+                    if attempt == 0 and time.time() - index.built >= INDEX_RESCAN_DELAY:
+                        retry.append(model_name) # nothing found in an old index: rescan once
+                    else:
+                        found[model_name] = None
+                    continue
+                (relative_name, full_path, _) = _choose(model_name, candidates)
+                if not os.path.isfile(full_path) and attempt == 0:
+                    retry.append(model_name) # removed since the scan
+                    continue
+                if len(candidates) > 1:
+                    logger.info(f"ModelIndex : [{model_name}] matches {len(candidates)} {model_type} files, using [{relative_name}]")
+                found[model_name] = (relative_name, full_path, tier)
+            if len(retry) == 0:
+                break
+            pending = retry
+        for model_name in pending:
+            found.setdefault(model_name, None)
+        return found
+
+    def suggest_many(self, model_type:str, model_names:list) -> dict:
+        # {model_name: (relative name, similarity) or None} of the files whose name is the most similar to
+        # each of model_names (at least FUZZY_THRESHOLD). Only a hint for a model not found: a similar name
+        # may well be another version of the model, so it is never used in place of the one requested
+        if FUZZY_THRESHOLD <= 0:
+            return {model_name: None for model_name in model_names}
+        index = self._get(model_type)
+        suggestions = {}
+        for model_name in dict.fromkeys(model_names):
+            (similarity, candidates) = index.fuzzy(model_name, FUZZY_THRESHOLD)
+            suggestions[model_name] = (_choose(model_name, candidates)[0], similarity) if len(candidates) > 0 else None
+        return suggestions
+
+MODEL_INDEX = ModelIndex()
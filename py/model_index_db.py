@@ -0,0 +1,146 @@
+import folder_paths
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from ..config_variables import SETTINGS_DIR, MODEL_INDEX_CONFIG
+from .logging import logger
+
+# ===== PERSISTENT MODEL FILES INDEX =======================================================================================================
+
+# Configured by the model_index section of config.yaml, e.g. :
+#
+# model_index:
+#     database: true                  # keep the index in ntx_data/model_index.sqlite
+#     preload: [loras, checkpoints]   # model types whose ComfyUI file lists are filled from it at startup
+#
+# The database keeps, for every folder of the models, its mtime, its subfolders and its
+# files (size and mtime). A folder whose mtime did not change has the same entries, so
+# revalidating a tree costs one stat per folder instead of listing all of them: on a
+# network volume a restart no longer walks the whole models tree. (A file rewritten in
+# place keeps its previous size and mtime until its folder changes.)
+
+# folders never scanned (same as folder_paths)
+EXCLUDED_DIR_NAMES = [".git"]
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS roots (model_type TEXT, root TEXT, PRIMARY KEY (model_type, root))",
+    "CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, mtime REAL, subdirs TEXT)",
+    "CREATE TABLE IF NOT EXISTS files (dir TEXT, name TEXT, size INTEGER, mtime REAL, PRIMARY KEY (dir, name))",
+]
+
+class ModelIndexDatabase():
+    """SQLite copy of the content of the model folders, revalidated with the folder mtimes."""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        connection = sqlite3.connect(str(self.path), timeout=30)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        return connection
+
+    def _scan_root(self, connection, root:str) -> (list, dict, int):
+        # files [(folder, name, size, mtime)] and folders {path: mtime} of a root, and the number of folders listed again
+        files = []
+        dirs = {}
+        listed = 0
+        stack = [root]
+        while stack:
+            dir_path = stack.pop()
+            try:
+                mtime = os.path.getmtime(dir_path)
+            except OSError:
+                continue
+            dirs[dir_path] = mtime
+            row = connection.execute("SELECT mtime, subdirs FROM dirs WHERE path = ?", (dir_path,)).fetchone()
+            if row is not None and row[0] == mtime:
+                subdirs = json.loads(row[1])
+                files.extend(connection.execute("SELECT dir, name, size, mtime FROM files WHERE dir = ?", (dir_path,)).fetchall())
+            else:
+                listed += 1
+                subdirs = []
+                dir_files = []
+                try:
+                    entries = list(os.scandir(dir_path))
+                except OSError:
+                    entries = []
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=True):
+                            if not entry.name in EXCLUDED_DIR_NAMES:
+                                subdirs.append(entry.name)
+                        else:
+                            stat = entry.stat(follow_symlinks=True)
+                            dir_files.append((dir_path, entry.name, stat.st_size, stat.st_mtime))
+                    except OSError:
+                        continue
+                connection.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)", (dir_path, mtime, json.dumps(sorted(subdirs))))
+                connection.execute("DELETE FROM files WHERE dir = ?", (dir_path,))
+                connection.executemany("INSERT INTO files VALUES (?, ?, ?, ?)", dir_files)
+                files.extend(dir_files)
+            stack.extend(os.path.join(dir_path, name) for name in sorted(subdirs, reverse=True))
+
+        # forget the folders of this root that no longer exist
+        prefix = os.path.join(root, "")
+        for (dir_path,) in connection.execute("SELECT path FROM dirs WHERE path = ? OR substr(path, 1, ?) = ?", (root, len(prefix), prefix)).fetchall():
+            if not dir_path in dirs:
+                connection.execute("DELETE FROM dirs WHERE path = ?", (dir_path,))
+                connection.execute("DELETE FROM files WHERE dir = ?", (dir_path,))
+        return (files, dirs, listed)
+
+    def scan(self, model_type:str) -> (list, dict):
+        """Content of the folders of a model type:
+        - files   : [(model_dir, folder rank, relative name, full path, size, mtime)], all extensions
+        - folders : {folder: mtime} of the folders and all their subfolders
+        """
+        model_dirs = folder_paths.folder_names_and_paths.get(model_type, ([], set()))[0]
+        start = time.perf_counter()
+        files = []
+        folders = {}
+        listed = 0
+        with self.lock:
+            connection = self._connect()
+            try:
+                for (rank, model_dir) in enumerate(model_dirs):
+                    if not os.path.isdir(model_dir):
+                        continue
+                    connection.execute("INSERT OR IGNORE INTO roots VALUES (?, ?)", (model_type, model_dir))
+                    (root_files, root_dirs, root_listed) = self._scan_root(connection, model_dir)
+                    for (dir_path, name, size, mtime) in root_files:
+                        full_path = os.path.join(dir_path, name)
+                        files.append((model_dir, rank, os.path.relpath(full_path, model_dir), full_path, size, mtime))
+                    folders.update(root_dirs)
+                    listed += root_listed
+                connection.commit()
+            finally:
+                connection.close()
+        logger.info(f"ModelIndexDatabase : {model_type} - {len(files)} files, {listed}/{len(folders)} folders listed again in {time.perf_counter() - start:.2f} s")
+        return (files, folders)
+
+    def filename_list(self, model_type:str):
+        # same value as folder_paths builds in filename_list_cache: (sorted names, {folder: mtime}, time)
+        (files, folders) = self.scan(model_type)
+        extensions = folder_paths.folder_names_and_paths.get(model_type, ([], set()))[1]
+        names = set(relative_name for (_, _, relative_name, _, _, _) in files
+                    if len(extensions) == 0 or os.path.splitext(relative_name)[1].lower() in extensions)
+        return (sorted(names), folders, time.perf_counter())
+
+MODEL_INDEX_DB = ModelIndexDatabase(SETTINGS_DIR / "model_index.sqlite") if MODEL_INDEX_CONFIG.get("database", True) else None
+
+def preload_filename_lists():
+    # fill the file lists of ComfyUI for the configured model types from the database, before anything scans them
+    if MODEL_INDEX_DB is None:
+        return
+    for model_type in MODEL_INDEX_CONFIG.get("preload", None) or []:
+        model_type = folder_paths.map_legacy(str(model_type))
+        if model_type in folder_paths.filename_list_cache or not model_type in folder_paths.folder_names_and_paths:
+            continue
+        try:
+            folder_paths.filename_list_cache[model_type] = MODEL_INDEX_DB.filename_list(model_type)
+        except Exception as e:
+            logger.warning(f"ModelIndexDatabase : cannot preload {model_type} - {e}")
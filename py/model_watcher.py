@@ -0,0 +1,293 @@
+import folder_paths
+
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+import threading
+import time
+
+from ..config_variables import WATCHER
+from .logging import logger
+from .model_index import MODEL_INDEX
+
+# ===== MODEL FOLDERS WATCHER ==============================================================================================================
+
+# Configured by the watcher section of config.yaml, e.g. :
+#
+# watcher:
+#     mode: auto                  # auto (inotify if available, else polling), inotify, poll or off
+#     model_types: [loras]        # model types whose folders are watched
+#     poll_interval: 10           # seconds between two checks of the folder mtimes, in poll mode
+#
+# Files added, removed or renamed in the watched folders are applied at once to the
+# model index of find_model_file and to the filename lists cached by folder_paths,
+# so a download that lands mid-session is visible without any rescan.
+
+# folders never scanned (same as folder_paths)
+EXCLUDED_DIR_NAMES = [".git"]
+
+WATCHER_THREAD = None
+
+def _watched_roots(model_types:list) -> list:
+    # (model_type, model_dir) of every existing folder of the watched model types
+    roots = []
+    for model_type in model_types:
+        model_type = folder_paths.map_legacy(model_type)
+        for model_dir in folder_paths.folder_names_and_paths.get(model_type, ([], set()))[0]:
+            if os.path.isdir(model_dir):
+                roots.append((model_type, model_dir))
+    return roots
+
+def _walk_dirs(path:str) -> list:
+    # path and all its subfolders
+    dirs = [path]
+    for (dir_path, dir_names, _) in os.walk(path, followlinks=True):
+        dir_names[:] = [name for name in dir_names if not name in EXCLUDED_DIR_NAMES]
+        dirs.extend(os.path.join(dir_path, name) for name in dir_names)
+    return dirs
+
+class ModelFolderChanges():
+    """Apply the changes of the watched folders to the model index and to the folder_paths caches."""
+    def __init__(self, roots:list):
+        self.roots = roots
+
+    def _roots_of(self, path:str) -> list:
+        return [(model_type, model_dir) for (model_type, model_dir) in self.roots
+                if path == model_dir or path.startswith(os.path.join(model_dir, ""))]
+
+    def _update_filename_list(self, model_type:str, model_dir:str, path:str, added:bool, is_dir:bool):
+        # folder_paths keeps (sorted names, {folder: mtime}, time) and rescans everything when a folder mtime
+        # differs: the names and the mtimes of the changed folders are updated so that the cache stays valid
+        cached = folder_paths.filename_list_cache.get(model_type, None)
+        if cached is None:
+            return # not scanned yet
+        (names, folders) = (set(cached[0]), dict(cached[1]))
+        extensions = folder_paths.folder_names_and_paths[model_type][1]
+        relative_name = os.path.relpath(path, model_dir)
+        prefix = os.path.join(relative_name, "")
+        if is_dir:
+            if added:
+                for dir_path in _walk_dirs(path):
+                    folders[dir_path] = os.path.getmtime(dir_path)
+                    for file_name in os.listdir(dir_path):
+                        file_path = os.path.join(dir_path, file_name)
+                        if os.path.isfile(file_path):
+                            names.add(os.path.relpath(file_path, model_dir))
+            else:
+                names = set(name for name in names if not name.startswith(prefix))
+                folders = {folder: mtime for (folder, mtime) in folders.items() if folder != path and not folder.startswith(os.path.join(path, ""))}
+        elif added:
+            names.add(relative_name)
+        else:
+            names.discard(relative_name)
+        parent = os.path.dirname(path)
+        try:
+            folders[parent] = os.path.getmtime(parent)
+        except OSError:
+            pass
+        names = sorted(name for name in names if len(extensions) == 0 or os.path.splitext(name)[1].lower() in extensions)
+        folder_paths.filename_list_cache[model_type] = (names, folders) + tuple(cached[2:])
+
+    def added(self, path:str, is_dir:bool=False):
+        for (model_type, model_dir) in self._roots_of(path):
+            if is_dir:
+                for dir_path in _walk_dirs(path):
+                    for file_name in sorted(os.listdir(dir_path)):
+                        file_path = os.path.join(dir_path, file_name)
+                        if os.path.isfile(file_path):
+                            MODEL_INDEX.file_added(model_type, model_dir, file_path)
+            else:
+                MODEL_INDEX.file_added(model_type, model_dir, path)
+            self._update_filename_list(model_type, model_dir, path, True, is_dir)
+        logger.info(f"ModelWatcher : added {path}")
+
+    def removed(self, path:str, is_dir:bool=False):
+        for (model_type, model_dir) in self._roots_of(path):
+            MODEL_INDEX.file_removed(model_type, path, is_dir)
+            self._update_filename_list(model_type, model_dir, path, False, is_dir)
+        logger.info(f"ModelWatcher : removed {path}")
+
+    def resync(self):
+        # events were lost: forget everything, rebuilt on next use
+        for (model_type, _) in self.roots:
+            MODEL_INDEX.invalidate(model_type)
+            folder_paths.filename_list_cache.pop(model_type, None)
+        logger.warning("ModelWatcher : events lost, indexes will be rebuilt")
+
+# ----- inotify (Linux) --------------------------------------------------------------------------------------------------------------------
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM  = 0x00000040
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_DELETE      = 0x00000200
+IN_Q_OVERFLOW  = 0x00004000
+IN_IGNORED     = 0x00008000
+IN_ISDIR       = 0x40000000
+IN_CLOEXEC     = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+EVENT_HEADER = struct.Struct("iIII") # wd, mask, cookie, len
+
+class Inotify():
+    # minimal inotify binding (libc through ctypes), one watch per folder as inotify is not recursive
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths = {} # wd -> folder
+
+    @staticmethod
+    def available() -> bool:
+        if not sys.platform.startswith("linux"):
+            return False
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        try:
+            return hasattr(ctypes.CDLL(libc_name), "inotify_init1")
+        except OSError:
+            return False
+
+    def add_tree(self, path:str):
+        for dir_path in _walk_dirs(path):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir_path), WATCH_MASK)
+            if wd < 0:
+                logger.warning(f"ModelWatcher : cannot watch {dir_path} - {os.strerror(ctypes.get_errno())}")
+                continue
+            self.paths[wd] = dir_path
+
+    def remove_tree(self, path:str):
+        prefix = os.path.join(path, "")
+        for (wd, dir_path) in list(self.paths.items()):
+            if dir_path == path or dir_path.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.paths[wd]
+
+    def events(self):
+        # blocking read, yield (folder, mask, name)
+        data = os.read(self.fd, 64 * 1024)
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            (wd, mask, _, length) = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            yield (self.paths.get(wd, None), mask, name)
+
+def _run_inotify(changes:ModelFolderChanges):
+    inotify = Inotify()
+    for (_, model_dir) in changes.roots:
+        inotify.add_tree(model_dir)
+    logger.info(f"ModelWatcher : inotify, {len(inotify.paths)} folders watched")
+    while True:
+        for (folder, mask, name) in inotify.events():
+            if mask & IN_Q_OVERFLOW:
+                changes.resync()
+                continue
+            if folder is None or mask & IN_IGNORED or name in EXCLUDED_DIR_NAMES:
+                continue
+            path = os.path.join(folder, name) if name else folder
+            is_dir = bool(mask & IN_ISDIR)
+            try:
+                if is_dir and mask & (IN_CREATE | IN_MOVED_TO):
+                    inotify.add_tree(path)
+                    changes.added(path, is_dir=True)
+                elif is_dir and mask & (IN_DELETE | IN_MOVED_FROM):
+                    inotify.remove_tree(path)
+                    changes.removed(path, is_dir=True)
+                elif not is_dir and mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    # files are added once complete (IN_CREATE comes before the data is written)
+                    changes.added(path)
+                elif not is_dir and mask & (IN_DELETE | IN_MOVED_FROM):
+                    changes.removed(path)
+            except Exception as e:
+                logger.warning(f"ModelWatcher : {path} - {e}")
+
+# ----- polling of the folder mtimes (any platform) ----------------------------------------------------------------------------------------
+
+def _list_folder(dir_path:str) -> (float, set, set):
+    # (mtime, files, subfolders) of a folder
+    (files, subdirs) = (set(), set())
+    mtime = os.path.getmtime(dir_path)
+    for entry in os.scandir(dir_path):
+        if entry.is_dir(follow_symlinks=True):
+            if not entry.name in EXCLUDED_DIR_NAMES:
+                subdirs.add(entry.name)
+        else:
+            files.add(entry.name)
+    return (mtime, files, subdirs)
+
+def _run_poll(changes:ModelFolderChanges, interval:float):
+    # a folder mtime changes when an entry is added, removed or renamed in it: only those folders are listed again
+    folders = {} # folder -> (mtime, files, subfolders)
+
+    def add_tree(path:str):
+        for dir_path in _walk_dirs(path):
+            try:
+                folders[dir_path] = _list_folder(dir_path)
+            except OSError:
+                pass
+
+    for (_, model_dir) in changes.roots:
+        add_tree(model_dir)
+    logger.info(f"ModelWatcher : polling every {interval} s, {len(folders)} folders watched")
+    while True:
+        time.sleep(interval)
+        for dir_path in list(folders.keys()):
+            if not dir_path in folders:
+                continue # removed with its parent
+            (mtime, files, subdirs) = folders[dir_path]
+            try:
+                if os.path.getmtime(dir_path) == mtime:
+                    continue
+                (new_mtime, new_files, new_subdirs) = _list_folder(dir_path)
+            except OSError:
+                continue # the folder itself is gone: handled by its parent
+            folders[dir_path] = (new_mtime, new_files, new_subdirs)
+            try:
+                for name in sorted(files - new_files):
+                    changes.removed(os.path.join(dir_path, name))
+                for name in sorted(new_files - files):
+                    changes.added(os.path.join(dir_path, name))
+                for name in sorted(subdirs - new_subdirs):
+                    path = os.path.join(dir_path, name)
+                    for sub_path in [p for p in folders.keys() if p == path or p.startswith(os.path.join(path, ""))]:
+                        del folders[sub_path]
+                    changes.removed(path, is_dir=True)
+                for name in sorted(new_subdirs - subdirs):
+                    path = os.path.join(dir_path, name)
+                    add_tree(path)
+                    changes.added(path, is_dir=True)
+            except Exception as e:
+                logger.warning(f"ModelWatcher : {dir_path} - {e}")
+
+# ----- start ------------------------------------------------------------------------------------------------------------------------------
+
+def _run_watcher(mode:str, model_types:list, interval:float):
+    changes = ModelFolderChanges(_watched_roots(model_types))
+    if len(changes.roots) == 0:
+        return
+    if mode in ["auto", "inotify"] and Inotify.available():
+        try:
+            _run_inotify(changes)
+            return
+        except Exception as e:
+            logger.warning(f"ModelWatcher : inotify failed, falling back to polling - {e}")
+    elif mode == "inotify":
+        logger.warning("ModelWatcher : inotify not available, falling back to polling")
+    _run_poll(changes, interval)
+
+def start_model_watcher():
+    # start the watcher in background (only once, and only if not disabled)
+    global WATCHER_THREAD
+    if WATCHER_THREAD is not None:
+        return
+    mode = str(WATCHER.get("mode", "auto") or "auto").lower()
+    if mode == "off":
+        return
+    model_types = list(WATCHER.get("model_types", None) or ["loras"])
+    interval = float(WATCHER.get("poll_interval", 10) or 10)
+    WATCHER_THREAD = threading.Thread(target=_run_watcher, args=(mode, model_types, interval), name="ntx-model-watcher", daemon=True)
+    WATCHER_THREAD.start()
@@ -9,6 +9,7 @@ from ..config_variables import ADDON_NAME, ADDON_PREFIX, ADDON_CATEGORY
 from .logging import logger
 from .utils import clone_data, DICT_TYPE, LORA_STACK_TYPE
 from .loras import ConvertLoraStringToStack
+from .lora_cache import prefetch_loras
 
 # ===== NODES ==============================================================================================================================
 
@@ -232,6 +233,9 @@ class ComplexPrompt(io.ComfyNode):
         lora_stack = [] if lora_stack is None else clone_data(lora_stack)
         text_params = {} if text_params is None else clone_data(text_params)
 
+        # the loras found in the positive prompt are prefetched by ConvertLoraStringToStack
+        prefetch_loras(lora_stack)
+
         # join the positive prompts and replace parameters
         prompt_positive = ""
         if prompt_positives is not None:
@@ -14,6 +14,7 @@ yaml = YAML(typ='safe', pure=True)
 
 from ..config_variables import ADDON_NAME, ADDON_PREFIX, API_PREFIX, ADDON_CATEGORY, SETTINGS_DIR
 from .logging import logger
+from .model_index import MODEL_INDEX
 
 from server import PromptServer
 
@@ -198,11 +199,17 @@ def extract_image_aspect_ratio(image_aspect_ratio):
 
 # ===== RETRIVE ACTUAL POSITION OF A MODEL =================================================================================================
 
-LIST_OF_MODEL_DIRS = {}
 def find_model_file(model_type:str, model_name:str, look_in_all_dirs:bool=True):
     # Try to find a model with the specified name (which may include subdirs)
     # Optionally look for the model file name in all subdirs for the given model_type (for example, in the whole loras directory, including all subdirs)
     # Return the actual model name including the subdir where it was found (if not found, return the input model_name) and the full absolute path (if found, otherwise none)
+    (model_name, model_path, _) = resolve_model_file(model_type, model_name, look_in_all_dirs)
+    return (model_name, model_path)
+
+def resolve_model_file(model_type:str, model_name:str, look_in_all_dirs:bool=True):
+    # Same as find_model_file, also returning how the model was found (None if not found):
+    # "exact" (at the position given), then, if look_in_all_dirs, "casefold" (same path ignoring case)
+    # or "name" (same file name in another subdir), see MODEL_INDEX
 
     model_type = folder_paths.map_legacy(model_type)
     model_name = clean_path(model_name)
@@ -212,35 +219,63 @@ def find_model_file(model_type:str, model_name:str, look_in_all_dirs:bool=True):
     try:
         model_path = folder_paths.get_full_path_or_raise(model_type, model_name)
         # logger.info(f"- found [{model_name}] => {model_path}")
-        return (model_name, model_path)
+        return (model_name, model_path, "exact")
     except Exception as e:
         logger.info(f"- {e}")
 
-    # if specified by caller, try to find the file name in all configured dirs
+    # if specified by caller, try to find the file in all configured dirs
+    # (indexes of the files of the model type, see MODEL_INDEX)
     if look_in_all_dirs:
-
-        # generate the list of candidate dirs, if needed
-        # this is a list of all dirs defined in ComfyUI including all subdirs
-        global LIST_OF_MODEL_DIRS
-        if not model_type in LIST_OF_MODEL_DIRS:
-            logger.info(f"* Retrieve list of {model_type} dirs defined in ComfyUI")
-            list_of_dirs_for_model_type = []
-            for model_dir in folder_paths.folder_names_and_paths.get(model_type, ([], []))[0]:
-                for subdir in Path(model_dir).rglob("*"):
-                    if subdir.is_dir():
-                        list_of_dirs_for_model_type.append((model_dir, subdir))
-            LIST_OF_MODEL_DIRS[model_type] = list_of_dirs_for_model_type
-
-        # check if a file with the required name exists in one of the model dirs
-        model_name_short = Path(model_name).name
-        for (model_dir, subdir) in LIST_OF_MODEL_DIRS[model_type]:
-            # logger.info(f"- try with dir:{subdir}")
-            model_path = subdir / model_name_short
-            if model_path.exists():
-                model_path = str(model_path)
-                model_name_found = model_path[len(model_dir)+1:]
-                logger.info(f"- found [{model_name}] => [{model_name_found}] => {model_path}")
-                return (model_name_found, model_path)
+        found = MODEL_INDEX.lookup(model_type, model_name)
+        if found is not None:
+            (model_name_found, model_path, tier) = found
+            logger.info(f"- found [{model_name}] => [{model_name_found}] => {model_path} ({tier})")
+            return (model_name_found, model_path, tier)
 
     # it could not find the model
-    return (model_name, None)
+    return (model_name, None, None)
+
+def resolve_models(models:list, look_in_all_dirs:bool=True, suggestions:dict=None) -> list:
+    # Resolve a set of models at once, models = [(model_type, model_name), ...]
+    # Return, in the same order, one (model name found, full path, tier) per entry, as resolve_model_file does;
+    # the names not at the position given are looked up with a single pass over the index of each model type.
+    # When suggestions is given, it receives {(model_type, model_name) as given: (most similar model name, similarity)}
+    # for the models not found (only a hint, never used in place of the model requested)
+
+    entries = [(folder_paths.map_legacy(model_type), clean_path(model_name)) for (model_type, model_name) in models]
+    resolved = {}
+    missing = {} # model_type -> [model_name, ...]
+
+    # first try : look for the models in the exact position specified by caller
+    for (model_type, model_name) in dict.fromkeys(entries):
+        model_path = folder_paths.get_full_path(model_type, model_name) if model_type in folder_paths.folder_names_and_paths else None
+        if model_path is not None:
+            resolved[(model_type, model_name)] = (model_name, model_path, "exact")
+        else:
+            missing.setdefault(model_type, []).append(model_name)
+
+    # then in all configured dirs, one lookup per model type (see MODEL_INDEX)
+    for (model_type, model_names) in missing.items():
+        found = MODEL_INDEX.lookup_many(model_type, model_names) if look_in_all_dirs else {}
+        for model_name in model_names:
+            if found.get(model_name, None) is not None:
+                resolved[(model_type, model_name)] = found[model_name]
+            else:
+                resolved[(model_type, model_name)] = (model_name, None, None)
+
+    if suggestions is not None:
+        similar = {}
+        for (model_type, model_names) in missing.items():
+            model_names = [model_name for model_name in model_names if resolved[(model_type, model_name)][1] is None]
+            if len(model_names) > 0:
+                similar.update({(model_type, model_name): suggestion for (model_name, suggestion) in MODEL_INDEX.suggest_many(model_type, model_names).items()})
+        for (model, entry) in zip(models, entries):
+            if similar.get(entry, None) is not None:
+                suggestions[tuple(model)] = similar[entry]
+
+    for ((_, model_name), (model_name_found, model_path, tier)) in resolved.items():
+        if model_path is None:
+            logger.info(f"- [{model_name}] not found")
+        elif tier != "exact":
+            logger.info(f"- found [{model_name}] => [{model_name_found}] => {model_path} ({tier})")
+    return [resolved[entry] for entry in entries]
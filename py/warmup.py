@@ -0,0 +1,123 @@
+import threading
+import time
+from pathlib import Path
+
+from ..config_variables import WARMUP
+from .logging import logger
+from .lora_cache import LORA_CACHE
+from .prompts import PROMPTS_DIR, load_prompts_map
+from .utils import find_model_file, resolve_models
+from ..scripts.ntxdata_file import NtxDataFile
+
+# ===== STARTUP WARM-UP ====================================================================================================================
+
+# Configured by the warmup section of config.yaml, e.g. :
+#
+# warmup:
+#     loras:                                  # loaded into the LoRA cache of ApplyLoraStack
+#         - ILL/chars/mychar.safetensors
+#     ntxdata:                                # side-car files of models, as model_type/model_name
+#         - checkpoints/ILL/mymodel.safetensors
+#     prompts:                                # folders of the prompt library (relative to ntx_data/prompts)
+#         - scenes/fantasy
+#
+# Everything runs in a background thread started once the nodes are registered:
+# server start is never delayed, and errors are only logged.
+
+WARMUP_THREAD = None
+
+def _read_file(path:Path) -> int:
+    # read a whole file so its pages end up in the OS cache
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            size += len(chunk)
+    return size
+
+def _warmup_loras(names:list):
+    found = resolve_models([("loras", str(name)) for name in names])
+    for (i, (name, (name_found, path, _))) in enumerate(zip(names, found), 1):
+        if path is None:
+            logger.warning(f"Warm-up : lora {i}/{len(names)} [{name}] not found")
+            continue
+        try:
+            (_, msg) = LORA_CACHE.load(path)
+        except Exception as e:
+            logger.warning(f"Warm-up : lora {i}/{len(names)} [{name_found}] cannot be loaded - {e}")
+            continue
+        logger.info(f"Warm-up : lora {i}/{len(names)} [{name_found}] - {msg}")
+
+def _warmup_ntxdata(entries:list):
+    for (i, entry) in enumerate(entries, 1):
+        entry = str(entry).replace("\\", "/")
+        if not "/" in entry:
+            logger.warning(f"Warm-up : ntxdata {i}/{len(entries)} [{entry}] is not in the form model_type/model_name")
+            continue
+        (model_type, model_name) = entry.split("/", 1)
+        (model_name, model_path) = find_model_file(model_type, model_name)
+        if model_path is None:
+            logger.warning(f"Warm-up : ntxdata {i}/{len(entries)} [{entry}] model not found")
+            continue
+        loaded = []
+        try:
+            for suffix in [".ntxdata", ".txt"]:
+                sidecar_path = Path(model_path).with_suffix(suffix)
+                if not sidecar_path.is_file():
+                    continue
+                if suffix == ".ntxdata":
+                    NtxDataFile().load(sidecar_path)
+                else:
+                    _read_file(sidecar_path)
+                loaded.append(suffix)
+        except Exception as e:
+            logger.warning(f"Warm-up : ntxdata {i}/{len(entries)} [{model_name}] cannot be read - {e}")
+            continue
+        logger.info(f"Warm-up : ntxdata {i}/{len(entries)} [{model_name}] - {', '.join(loaded) if loaded else 'no side-car file'}")
+
+def _warmup_prompts(folders:list):
+    load_prompts_map()
+    for (i, folder) in enumerate(folders, 1):
+        folder_path = PROMPTS_DIR / str(folder)
+        try:
+            folder_path.resolve().relative_to(PROMPTS_DIR.resolve())
+        except ValueError:
+            logger.warning(f"Warm-up : prompts {i}/{len(folders)} [{folder}] is outside of the prompt library")
+            continue
+        if not folder_path.is_dir():
+            logger.warning(f"Warm-up : prompts {i}/{len(folders)} [{folder}] not found")
+            continue
+        try:
+            files = [path for path in folder_path.rglob("*") if path.is_file()]
+            size = sum(_read_file(path) for path in files)
+        except Exception as e:
+            logger.warning(f"Warm-up : prompts {i}/{len(folders)} [{folder}] cannot be read - {e}")
+            continue
+        logger.info(f"Warm-up : prompts {i}/{len(folders)} [{folder}] - {len(files)} files, {size // 1024} KB")
+
+def _run_warmup():
+    start = time.perf_counter()
+    steps = [
+        ("loras", _warmup_loras),
+        ("ntxdata", _warmup_ntxdata),
+        ("prompts", _warmup_prompts),
+    ]
+    for (key, function) in steps:
+        entries = WARMUP.get(key, None) or []
+        if len(entries) == 0:
+            continue
+        try:
+            function(list(entries))
+        except Exception as e:
+            logger.warning(f"Warm-up : {key} failed - {e}")
+    logger.info(f"Warm-up : completed in {time.perf_counter() - start:.1f} s")
+
+def start_warmup():
+    # start the warm-up in background (only once, and only if something is configured)
+    global WARMUP_THREAD
+    if WARMUP_THREAD is not None:
+        return
+    if not any(WARMUP.get(key, None) for key in ["loras", "ntxdata", "prompts"]):
+        return
+    logger.info("Warm-up : started in background")
+    WARMUP_THREAD = threading.Thread(target=_run_warmup, name="ntx-warmup", daemon=True)
+    WARMUP_THREAD.start()
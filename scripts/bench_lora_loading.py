@@ -0,0 +1,137 @@
+# TITLE : compare the LoRA loaders used by ApplyLoraStack (default vs memory-mapped)
+# VER 1.0
+
+"""
+Usage:
+    python scripts/bench_lora_loading.py [--sizes 50,200,500,2000] [--dir <tmp dir>] [--keep]
+
+For each size (in MB) a synthetic LoRA-like .safetensors file is written (pairs of
+fp16 lora_down / lora_up tensors), then every loader is run in a fresh subprocess
+and reports:
+- load time : time to get the state dict
+- read time : time to touch every tensor afterwards (forces the mapped pages in)
+- RSS / anon : growth of the resident set and of the anonymous (non file-backed)
+  memory of the process, from /proc/self/status (Linux only, otherwise RSS only)
+
+The "default" loader is what ApplyLoraStack uses without configuration
+(comfy.utils.load_torch_file, falling back to safetensors.torch.load_file when
+ComfyUI is not importable); "mmap" is the cache.lora_loader: mmap mode.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+LOADERS = ["default", "mmap"]
+
+def _memory_usage() -> dict:
+    usage = {"rss": 0, "anon": 0}
+    status = Path("/proc/self/status")
+    if status.is_file():
+        for line in status.read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                usage["rss"] = int(line.split()[1]) * 1024
+            elif line.startswith("RssAnon:"):
+                usage["anon"] = int(line.split()[1]) * 1024
+    else:
+        import resource
+        usage["rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return usage
+
+def create_synthetic_lora(path:Path, size_mb:int, rank:int=32, dim:int=3072):
+    import torch
+    from safetensors.torch import save_file
+
+    tensors = {}
+    pair_bytes = 2 * rank * dim * 2 # one down + one up tensor, fp16
+    pairs = max(1, (size_mb * 1024 * 1024) // pair_bytes)
+    for i in range(pairs):
+        tensors[f"lora_unet_block_{i}.lora_down.weight"] = torch.randn(rank, dim, dtype=torch.float16)
+        tensors[f"lora_unet_block_{i}.lora_up.weight"] = torch.randn(dim, rank, dtype=torch.float16)
+        tensors[f"lora_unet_block_{i}.alpha"] = torch.tensor(float(rank))
+    save_file(tensors, str(path), metadata={"ss_network_dim": str(rank)})
+
+def run_loader(loader:str, path:str) -> dict:
+    # executed in the child process
+    import torch
+
+    if loader == "mmap":
+        from safetensors_file import load_safetensors_mmap
+        load = load_safetensors_mmap
+    else:
+        try:
+            import comfy.utils
+            load = lambda p: comfy.utils.load_torch_file(p, safe_load=True)
+        except ImportError:
+            from safetensors.torch import load_file
+            load = load_file
+
+    before = _memory_usage()
+    start = time.perf_counter()
+    state_dict = load(path)
+    load_time = time.perf_counter() - start
+    after_load = _memory_usage()
+
+    start = time.perf_counter()
+    checksum = 0.0
+    for tensor in state_dict.values():
+        checksum += float(tensor.float().sum())
+    read_time = time.perf_counter() - start
+    after_read = _memory_usage()
+
+    return {
+        "tensors": len(state_dict),
+        "load_time": load_time,
+        "read_time": read_time,
+        "rss_load": after_load["rss"] - before["rss"],
+        "anon_load": after_load["anon"] - before["anon"],
+        "rss_read": after_read["rss"] - before["rss"],
+        "anon_read": after_read["anon"] - before["anon"],
+    }
+
+def _mb(value:int) -> str:
+    return f"{value / (1024 * 1024):8.1f}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LoRA loading: default vs memory-mapped")
+    parser.add_argument("--sizes", default="50,200,500,2000", help="comma-separated file sizes in MB")
+    parser.add_argument("--dir", default=None, help="where to write the synthetic files (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic files")
+    parser.add_argument("--child", nargs=2, metavar=("LOADER", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_loader(args.child[0], args.child[1])))
+        return
+
+    work_dir = Path(args.dir) if args.dir else Path(tempfile.mkdtemp(prefix="ntx_lora_bench_"))
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"{'size MB':>8} {'loader':>8} {'load s':>8} {'read s':>8} {'RSS load':>9} {'anon load':>9} {'RSS read':>9} {'anon read':>9}")
+    for size_mb in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        path = work_dir / f"synthetic_{size_mb}MB.safetensors"
+        if not path.is_file():
+            create_synthetic_lora(path, size_mb)
+        for loader in LOADERS:
+            result = subprocess.run([sys.executable, __file__, "--child", loader, str(path)], capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"{size_mb:>8} {loader:>8} failed: {result.stderr.strip().splitlines()[-1:]}")
+                continue
+            r = json.loads(result.stdout.strip().splitlines()[-1])
+            print(f"{size_mb:>8} {loader:>8} {r['load_time']:8.3f} {r['read_time']:8.3f} {_mb(r['rss_load'])}  {_mb(r['anon_load'])} {_mb(r['rss_read'])}  {_mb(r['anon_read'])}")
+        if not args.keep:
+            os.remove(path)
+
+    if not args.keep and not args.dir:
+        work_dir.rmdir()
+
+if __name__ == "__main__":
+    main()
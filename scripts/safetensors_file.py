@@ -0,0 +1,129 @@
+# VER 1.0
+
+"""
+Minimal reader for .safetensors files.
+
+File layout:
+- 8 bytes   : little-endian unsigned 64-bit length N of the header
+- N bytes   : JSON header { "tensor_name": {"dtype": "F16", "shape": [..], "data_offsets": [begin, end]}, ...,
+                            "__metadata__": {"key": "value", ...} }
+- remaining : raw tensor data, offsets relative to the end of the header
+"""
+
+import json
+import mmap
+import struct
+
+from pathlib import Path
+
+SAFETENSORS_EXTENSION = ".safetensors"
+
+# safetensors dtype name -> (torch dtype attribute, bytes per element)
+SAFETENSORS_DTYPES = {
+    "F64":     ("float64", 8),
+    "F32":     ("float32", 4),
+    "F16":     ("float16", 2),
+    "BF16":    ("bfloat16", 2),
+    "F8_E4M3": ("float8_e4m3fn", 1),
+    "F8_E5M2": ("float8_e5m2", 1),
+    "I64":     ("int64", 8),
+    "I32":     ("int32", 4),
+    "I16":     ("int16", 2),
+    "I8":      ("int8", 1),
+    "U8":      ("uint8", 1),
+    "BOOL":    ("bool", 1),
+}
+
+def read_safetensors_header(path) -> (dict, int):
+    """Read the JSON header of a .safetensors file without touching the tensor data.
+    Return the header dict and the offset of the first data byte in the file.
+    """
+    with open(path, "rb") as f:
+        size_bytes = f.read(8)
+        if len(size_bytes) != 8:
+            raise ValueError(f"{path} is not a safetensors file (too short)")
+        (header_size,) = struct.unpack("<Q", size_bytes)
+        header_bytes = f.read(header_size)
+        if len(header_bytes) != header_size:
+            raise ValueError(f"{path} is not a safetensors file (truncated header)")
+    header = json.loads(header_bytes)
+    return (header, 8 + header_size)
+
+# keys of the LoRA down-projection tensors (first dim = rank) for the usual naming schemes
+LORA_RANK_KEY_SUFFIXES = [".lora_down.weight", ".lora_A.weight", ".hada_w1_b", ".hada_w2_b"]
+
+# __metadata__ keys holding the base model and the training resolution, by priority
+METADATA_BASE_MODEL_KEYS = ["modelspec.architecture", "ss_base_model_version", "ss_sd_model_name"]
+METADATA_RESOLUTION_KEYS = ["modelspec.resolution", "ss_resolution"]
+
+def summarize_safetensors_header(header:dict) -> dict:
+    """Describe a safetensors file from its header only:
+    - tensors    : number of tensors
+    - dtype      : dtype holding most of the data (e.g. "F16")
+    - bytes      : total size of the tensor data
+    - rank       : most common rank of the LoRA down-projections (None if not a LoRA)
+    - base_model : base model declared in __metadata__ ("" if unknown)
+    - resolution : training resolution declared in __metadata__ ("" if unknown)
+    """
+    metadata = header.get("__metadata__", {}) or {}
+
+    tensors = 0
+    total_bytes = 0
+    bytes_by_dtype = {}
+    ranks = {}
+    for (key, info) in header.items():
+        if key == "__metadata__":
+            continue
+        tensors += 1
+        (begin, end) = info.get("data_offsets", (0, 0))
+        total_bytes += end - begin
+        dtype = info.get("dtype", "")
+        bytes_by_dtype[dtype] = bytes_by_dtype.get(dtype, 0) + (end - begin)
+        shape = info.get("shape", [])
+        if len(shape) > 0 and any(key.endswith(suffix) for suffix in LORA_RANK_KEY_SUFFIXES):
+            ranks[shape[0]] = ranks.get(shape[0], 0) + 1
+
+    return {
+        "tensors": tensors,
+        "dtype": max(bytes_by_dtype, key=bytes_by_dtype.get) if bytes_by_dtype else "",
+        "bytes": total_bytes,
+        "rank": max(ranks, key=ranks.get) if ranks else None,
+        "base_model": next((str(metadata[k]) for k in METADATA_BASE_MODEL_KEYS if metadata.get(k)), ""),
+        "resolution": next((str(metadata[k]) for k in METADATA_RESOLUTION_KEYS if metadata.get(k)), ""),
+    }
+
+def load_safetensors_mmap(path) -> dict:
+    """Load a .safetensors file as a dict of tensors backed by a memory map of the file.
+
+    No tensor data is copied: the tensors share the OS page cache with every other
+    mapping of the same file, and pages are only read from disk when accessed.
+    The mapping is private (copy-on-write), so an in-place write on a tensor
+    never reaches the file.
+    """
+    import torch
+
+    (header, data_start) = read_safetensors_header(path)
+    header.pop("__metadata__", None)
+
+    state_dict = {}
+    if len(header) == 0:
+        return state_dict
+
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    for (key, info) in header.items():
+        (dtype_name, itemsize) = SAFETENSORS_DTYPES[info["dtype"]]
+        dtype = getattr(torch, dtype_name)
+        (begin, end) = info["data_offsets"]
+        count = (end - begin) // itemsize
+        if count == 0:
+            state_dict[key] = torch.empty(info["shape"], dtype=dtype)
+        else:
+            # the tensor keeps a reference to the map, which stays open as long as any tensor uses it
+            state_dict[key] = torch.frombuffer(buffer, dtype=dtype, count=count, offset=data_start + begin).reshape(info["shape"])
+
+    return state_dict
+
+def is_safetensors_file(path) -> bool:
+    return Path(path).suffix.lower() == SAFETENSORS_EXTENSION
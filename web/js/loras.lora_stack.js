@@ -557,6 +557,7 @@ function openContextMenu(e, items) {
 
 let _loraCache = null;
 let _loraFetch = null;
+let _loraVersion = null;   // version (ETag) of the list held in _loraCache
 
 function fetchLoraList() {
     if (_loraCache) return Promise.resolve(_loraCache);
@@ -564,6 +565,7 @@ function fetchLoraList() {
     _loraFetch = fetch(`/${API_PREFIX}/get_loras_list`)
         .then(r => {
             if (!r.ok) throw new Error(`get_loras_list HTTP ${r.status}`);
+            _loraVersion = (r.headers.get("ETag") ?? "").replace(/"/g, "") || null;
             return r.json();
         })
         .then(list => { _loraCache = ["none", ...list]; return _loraCache; })
@@ -576,16 +578,39 @@ function fetchLoraList() {
     return _loraFetch;
 }
 
-// Force the backend to re-scan the loras folder on disk and replace the cache.
-// On failure the previous cache is kept so the UI keeps working with the old list.
+// Apply an answer of the list endpoints called with ?since=<version>:
+// either the full list, or the names added/removed since the version we hold.
+function applyLoraListDelta(previous, data) {
+    _loraVersion = data.version ?? null;
+    if (data.names) return ["none", ...data.names];
+    const removed = new Set(data.removed ?? []);
+    const names = (previous ?? ["none"]).filter(name => name !== "none" && !removed.has(name));
+    return ["none", ...[...names, ...(data.added ?? [])].sort()];
+}
+
+// Ask the backend to re-scan the loras folder on disk and update the cache.
+// Only the changes since the list we hold are sent back (nothing at all if the
+// list did not change). On failure the previous cache is kept so the UI keeps
+// working with the old list.
 function reloadLoraList() {
     const previous = _loraCache;
-    _loraFetch = fetch(`/${API_PREFIX}/reload_loras_list`, { method: "POST" })
+    const since = previous && _loraVersion ? `?since=${encodeURIComponent(_loraVersion)}` : "";
+    _loraInfo = null;
+    _loraInfoFetch = null;
+    _loraFetch = fetch(`/${API_PREFIX}/reload_loras_list${since}`, { method: "POST" })
         .then(r => {
             if (!r.ok) throw new Error(`reload_loras_list HTTP ${r.status}`);
             return r.json();
         })
-        .then(list => { _loraCache = ["none", ...list]; return _loraCache; })
+        .then(data => {
+            if (Array.isArray(data)) {
+                _loraVersion = null;
+                _loraCache = ["none", ...data];
+            } else {
+                _loraCache = applyLoraListDelta(previous, data);
+            }
+            return _loraCache;
+        })
         .catch(err => {
             console.warn("[LoraStack] failed to reload LoRA list:", err);
             _loraFetch = null;
@@ -595,6 +620,38 @@ function reloadLoraList() {
     return _loraFetch;
 }
 
+// Header-only data of the LoRA files (size, rank, base model ...), keyed by name.
+// Only used for tooltips, so it is fetched lazily and failures are ignored.
+let _loraInfo = null;
+let _loraInfoFetch = null;
+
+function fetchLoraInfo() {
+    if (_loraInfo) return Promise.resolve(_loraInfo);
+    if (_loraInfoFetch) return _loraInfoFetch;
+    _loraInfoFetch = fetch(`/${API_PREFIX}/get_loras_list?info=1`)
+        .then(r => {
+            if (!r.ok) throw new Error(`get_loras_list HTTP ${r.status}`);
+            return r.json();
+        })
+        .then(data => { _loraInfo = data.info ?? {}; return _loraInfo; })
+        .catch(err => {
+            console.warn("[LoraStack] failed to fetch LoRA info:", err);
+            _loraInfoFetch = null;
+            return {};
+        });
+    return _loraInfoFetch;
+}
+
+function formatLoraInfo(name) {
+    const info = _loraInfo?.[name];
+    if (!info) return name;
+    const parts = [`${(info.file_bytes / (1024 * 1024)).toFixed(1)} MB`, info.dtype];
+    if (info.rank) parts.push(`rank ${info.rank}`);
+    if (info.base_model) parts.push(info.base_model);
+    if (info.resolution) parts.push(info.resolution);
+    return `${name}\n${parts.join(" · ")}`;
+}
+
 // Comparison key for lora names: path-separator and case insensitive, so
 // "ILL\\aaa.safetensors" matches "ill/aaa.safetensors".
 function normLoraKey(name) {
@@ -744,6 +801,7 @@ function buildLoraTree(loraNames) {
 
 function openTreeSelector(currentName, loraNames, onConfirm) {
     document.querySelector(".cll-tree-overlay")?.remove();
+    fetchLoraInfo();
 
     const overlay = document.createElement("div");
     overlay.className = "cll-tree-overlay";
@@ -867,7 +925,8 @@ function openTreeSelector(currentName, loraNames, onConfirm) {
             const row = document.createElement("div");
             row.className = "cll-tree-row";
             row.style.paddingLeft = indent + "px";
-            row.title = file.full;
+            row.title = formatLoraInfo(file.full);
+            row.addEventListener("mouseenter", () => { row.title = formatLoraInfo(file.full); });
 
             const caret = document.createElement("span");
             caret.className = "cll-tree-caret";